@@ -1,14 +1,16 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import requests
-import urllib
-import json
-from IPython.core.display import display, HTML, JSON
-from types import SimpleNamespace
+import os
+import atexit
+import uuid
+import functools
 import logging
-import plotly.graph_objects as go
-import webbrowser
 import datetime
+from findata import FinancialDataAPI, iter_companies_series
+from eodstore import EodStore
+from resolver import ListingIndex
+from prefetch import PREFETCH, start_prefetcher
+from static_server import ROOT, METRICS_PORT, start_metrics_server, static_url
 
 ############ page config
 st.set_page_config(
@@ -39,197 +41,62 @@ st.markdown("Welcome to *_FinVerse_*! "
 logger = logging.getLogger()
 logger.setLevel(logging.INFO) # CRITICAL, ERROR, WARNING, INFO, DEBUG, NOTSET
 
-display(HTML("<style>.container { width:90% !important; }</style>"))
-
-class FinancialDataAPI:
-    def __init__(self):
-        self.url = 'https://web.api.six-group.com/api/findata'
-        
-        self.headers = {
-            "content-type": "application/json",
-            "accept": "application/json",
-            "api-version": "2022-06-01"
-        }
-        self.session = requests.session()
-        certificate_path = 'ch52991-hackathon1'
-        self.session.cert = (f'{certificate_path}/signed-certificate.pem', f'{certificate_path}/private-key.pem')
-    
-    def http_request(self, end_point:str, query_string:dict) -> str:
-        # Make an HTTP request and send the raw response
-        try:
-            http_request = f"{self.url}{end_point}?{urllib.parse.urlencode(query_string)}"
-            
-            r = self.session.get(http_request, headers=self.headers) #, verify='./six-certificate/certificate.pem')
-            if str(r.status_code)[0] != "2":
-                logging.debug(f"HTTP{r.status_code}: {r.content}")
-            else:
-                logging.debug(f"HTTP{r.status_code}: {json.dumps(json.loads(r.content), indent=2)}")
-                
-            return r
-        except requests.exceptions.SSLError as err:
-            logging.error(f"Error - {http_request}:\r\n{err}")
-            raise(Exception(str(err)))
-
-    def http_request_with_scheme_id(self, end_point:str, scheme:str, ids:list) -> str:
-        query_string = query_string = { 
-            'scheme': scheme,
-            'ids': ",".join(ids)
-        }
-        return self.http_request(end_point, query_string)        
-            
-    def _convert_response_to_object(self, http_response):
-        if str(http_response.status_code)[0] == "2":
-            obj = json.loads(http_response.content, object_hook=lambda d: SimpleNamespace(**d))
-            return obj
+######################### process wide resources #########################
+# Streamlit re-runs this script on every interaction, everything expensive to set up is created
+# once per server process, shared by all sessions and closed when the process exits
+
+DEFAULT_START_DATE = datetime.date(2022, 7, 1)
+# the ?debug=1 panel shows upstream traffic of all sessions, so it has to be switched on for the server
+DEBUG_PANEL = os.environ.get("FINDATA_DEBUG_PANEL", "0") == "1"
+
+@st.cache_resource
+def financial_data_api() -> FinancialDataAPI:
+    # pooled session with the client certificate loaded, plus the response cache
+    api = FinancialDataAPI()
+    atexit.register(api.close)
+    return api
+
+@st.cache_resource
+def eod_store_resource() -> EodStore:
+    store = EodStore()
+    atexit.register(store.close)
+    return store
+
+@st.cache_resource
+def listing_index_resource() -> ListingIndex:
+    index = ListingIndex()
+    atexit.register(index.close)
+    return index
+
+findata = financial_data_api()
+eod_store = eod_store_resource()
+listing_index = listing_index_resource()
+
+@st.cache_resource
+def prefetcher():
+    # warm the watch list in the background
+    prefetcher = start_prefetcher(findata, eod_store, listing_index, from_date=DEFAULT_START_DATE.isoformat())
+    atexit.register(prefetcher.stop)
+    return prefetcher
+
+if PREFETCH:
+    prefetcher()
+
+@st.cache_resource
+def metrics_server():
+    # Prometheus /metrics of this process when FINDATA_METRICS_PORT is set, the page files are served
+    # by Streamlit from ./static. A port already taken (e.g. by a second app process) only costs /metrics.
+    if METRICS_PORT is None:
         return None
-            
-    def text_search(self, query:str) -> object:
-        end_point = "/v1/searchInstruments"
-        #end_point = "/search/v1/"
-        query_string = { 'query': query }
-        resp = self.http_request(end_point, query_string)
-        
-        return self._convert_response_to_object(resp)
-    
-    def instrument_summary(self, scheme:str, instruments: list):
-        end_point = "/v1/instruments/referenceData/instrumentSummary"
-        #end_point = "/v1/summary/instruments"
-        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
-        return self._convert_response_to_object(resp)
-
-    def instrument_symbology(self, scheme:str, instruments: list):
-        end_point = "/v1/instruments/referenceData/instrumentSymbology"
-        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
-        return self._convert_response_to_object(resp)
-
-    def instrument_BASELIII_HQLA_EU(self, scheme:str, instruments: list):
-        end_point = "/v1/instruments/_regulatoryData/baseliiihqlaEU"
-        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
-        return self._convert_response_to_object(resp)
-
-    def instrument_BASELIII_HQLA_CH(self, scheme:str, instruments: list):
-        end_point = "/v1/instruments/_regulatoryData/baseliiihqlaCH"
-        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
-        return self._convert_response_to_object(resp)
-
-    def instrument_SFDR(self, scheme:str, instruments: list):
-        end_point = "/v1/instruments/esg/SFDRInvestee"
-        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
-        return self._convert_response_to_object(resp)
-
-    def instrument_TAXONOMY(self, scheme:str, instruments: list):
-        end_point = "/v1/instruments/esg/EUTaxonomyInvestee"
-        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
-        return self._convert_response_to_object(resp)
-
-    def instrument_EUESGMANUFACTURER(self, scheme:str, instruments: list):
-        end_point = "/v1/instruments/esg/EUESGManufacturer"
-        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
-        return self._convert_response_to_object(resp)
-    
-    def institution_summary(self, scheme:str, institutions: list):
-        end_point = "/v1/institutions/referenceData/institutionSummary"
-        resp = self.http_request_with_scheme_id(end_point, scheme, institutions)
-        return self._convert_response_to_object(resp)
-
-    def institution_symbology(self, scheme:str, institutions: list):
-        end_point = "/v1/institutions/referenceData/institutionSymbology"
-        resp = self.http_request_with_scheme_id(end_point, scheme, institutions)
-        return self._convert_response_to_object(resp)
-    
-    def institution_SFDR(self, scheme:str, institutions: list):
-        end_point = "/v1/institutions/esg/SFDRInvestee"
-        resp = self.http_request_with_scheme_id(end_point, scheme, institutions)
-        return self._convert_response_to_object(resp)
-
-    def institution_TAXONOMY(self, scheme:str, institutions: list):
-        end_point = "/v1/institutions/esg/EUTaxonomyInvestee"
-        resp = self.http_request_with_scheme_id(end_point, scheme, institutions)
-        return self._convert_response_to_object(resp)
-
-    def market_summary(self, scheme:str, markets: list):
-        end_point = "/v1/markets/referenceData/marketSummary"
-        resp = self.http_request_with_scheme_id(end_point, scheme, markets)
-        return self._convert_response_to_object(resp)
-    
-    def market_symboloy(self, scheme:str, markets: list):
-        end_point = "/v1/markets/referenceData/marketSymbology"
-        resp = self.http_request_with_scheme_id(end_point, scheme, markets)
-        return self._convert_response_to_object(resp)
-
-    def listing_EoDTimeseries(self, scheme:str, listings: list, from_date:str, to_date:str = ''):
-        end_point = "/v1/listings/marketData/eodTimeseries"
-        query_string = query_string = { 
-            'scheme': scheme,
-            'ids': ",".join(listings),
-            'from': from_date,
-            'to': to_date
-        }
-        resp = self.http_request(end_point, query_string)    
-        return self._convert_response_to_object(resp)
-    
-findata = FinancialDataAPI()
-
-######################### print_object_attributes #########################
-
-def print_object_attributes_text(valors, bcs, obj:object, tab_level:int=0, min_attr_length:int=30):
-    if obj is None: return
-    space_sep = "  "
-    space = space_sep*tab_level
-    
-    if type(obj) == list:
-        for o in obj:
-            if type(o) == object or type(o) == SimpleNamespace:
-                print_object_attributes_text(valors, bcs, o, tab_level+1, min_attr_length)
-    else:
-        for attr, value in obj.__dict__.items():
-            if type(value) == object or type(value) == SimpleNamespace or type(value) == list:
-                # st.markdown(f"{space}{attr}")
-
-                adjusted_min_attr_length = min_attr_length - (len(space_sep)*(tab_level+1))
-                if adjusted_min_attr_length < 0: adjusted_min_attr_length = 0
-                print_object_attributes_text(valors, bcs, value, tab_level+1, adjusted_min_attr_length)
-            else:
-                if attr == "valor":
-                    valors.append(value)
-                if attr == "bc":
-                    bcs.append(value)
-                # st.markdown(f"{space}{attr:<{min_attr_length}}: {value}")    
-
-    # if length of valors and bcs is greater than 0, return them
-    if len(valors) > 0 and len(bcs) > 0:
-        return valors, bcs 
-
-######################### print_object_attributes (time series) ######################### 
-
-def print_object_attributes_timeseries(highs, lows, obj:object, tab_level:int=0, min_attr_length:int=30):
-    if obj is None: return
-    space_sep = "  "
-    space = space_sep*tab_level
-    
-    if type(obj) == list:
-        for o in obj:
-            if type(o) == object or type(o) == SimpleNamespace:
-                print_object_attributes_timeseries(highs, lows, o, tab_level+1, min_attr_length)
-                # print()
-            # else:
-            #     print(f"{space}{o:<{min_attr_length}}")
-    else:
-        for attr, value in obj.__dict__.items():
-            if type(value) == object or type(value) == SimpleNamespace or type(value) == list:
-                # print(f"{space}{attr}")
-
-                adjusted_min_attr_length = min_attr_length - (len(space_sep)*(tab_level+1))
-                if adjusted_min_attr_length < 0: adjusted_min_attr_length = 0
-                print_object_attributes_timeseries(highs, lows, value, tab_level+1, adjusted_min_attr_length)
-            else:
-                if attr == "high":
-                    highs.append(value)
-                if attr == "low":
-                    lows.append(value) 
-    
-    # if length of dates and volumes is greater than 0, return them
-    return highs, lows
+    try:
+        server = start_metrics_server()
+    except OSError as err:
+        logging.warning(f"Error - serving /metrics on port {METRICS_PORT}, metrics are only shown in the debug panel: {err}")
+        return None
+    atexit.register(server.shutdown)
+    return server
+
+metrics_server()
 
 ######################### DASHBOARD #########################    
 
@@ -247,7 +114,7 @@ with st.sidebar.form(key='Form1'):
     )
 
     # add an input field for the user to enter the starting date
-    start_date = st.date_input("Enter a start date", datetime.date(2022, 7, 1), max_value=datetime.date(2023, 3, 21))
+    start_date = st.date_input("Enter a start date", DEFAULT_START_DATE, max_value=datetime.date(2023, 3, 21))
 
     # save the date in the format YYYY-MM-DD
     start_date = start_date.strftime("%Y-%m-%d")
@@ -269,174 +136,102 @@ with st.sidebar.form(key='Form1'):
 
 st.sidebar.image("imgs/START_Logo.png", use_column_width=True)
 
-if submit_button:
-
-    with st.spinner('Loading...'):
-
-        video_file = open('trailer.mp4', 'rb')
-        video_bytes = video_file.read()
-
-        diffs = []
-
-        # for each company in the list, get the company information
-        for company in options:
-
-            valors = []
-            bcs = []
-            highs = []
-            lows = []
-
-            count = 0
-
-            # while highs and lows are empty, get the company information
-            while len(highs) == 0 and len(lows) == 0:
-
-                try:
-                    obj = findata.text_search(company)
-                    valors, bcs = print_object_attributes_text(valors, bcs, obj)
-
-                    # get the EoD timeseries for the company
-                    obj = findata.listing_EoDTimeseries("VALOR_BC", [f"{valors[count]}_{bcs[count]}"], start_date, end_date)
-                    highs, lows = print_object_attributes_timeseries(highs, lows, obj)
-                
-                except:
-                    st.write("Error", company, count)
-
-                count += 1
-
-            # append the difference between each high and low to the list "decimals"
-            decimals = [(highs[i]-lows[i]) for i in range(len(highs))]
-            
-            # divide all elements in decimals by the maximum element in decimals
-            decimals = [i/max(decimals) for i in decimals]
-
-            # append the difference between each high and low to the list "diffs"
-            diffs.append(decimals)
-
-        # st.write("Differences: ", diffs)
-
-        components.html('<iframe src="https://caramel-lofty-newsprint.glitch.me/" style="position: absolute; height: 100%; width: 100%; border: none"></iframe>', height=390)
-
-        # components.html(
-        #     '''
-        #     <html lang="en">
-        #         <head>
-        #             <title>WebXR Application</title>
-        #             <link rel="icon" type="image/png" href="favicon.ico"/>
-        #             <meta name="description" content="3D Application">
-        #             <meta charset="utf-8">
-        #             <meta http-equiv="X-UA-Compatible" content="IE=edge">
-        #             <meta name="viewport" content="width=device-width, initial-scale=1">
-        #             <script src="https://aframe.io/releases/1.2.0/aframe.min.js"></script>
-        #             <script src="https://cdn.jsdelivr.net/gh/donmccurdy/aframe-extras@v6.1.0/dist/aframe-extras.min.js"></script>
-        #             <script type="text/javascript" src="js/webxr.js"></script>
-        #             <script type="text/javascript" src="js/joystick.js"></script>
-        #             <script type="text/javascript" src="js/camera-cube-env.js"></script>
-                    
-        #             <link rel="stylesheet" type="text/css" href="style.css">
-        #         </head>
-        #         <body onload="init();">
-        #             <a-scene   shadow="type: basic; autoUpdate: false;" renderer="antialias: false; colorManagement: false; physicallyCorrectLights: false;">
-        #                 <!-- Assets -->
-        #                 <a-assets>
-        #                     <a-asset-item id="amazon" src="./assets/amazon.gltf"></a-asset-item>
-        #                     <a-asset-item id="apple" src="./assets/apple.gltf"></a-asset-item>
-        #                     <a-asset-item id="boeing" src="./assets/boeing.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube" src="./assets/Cube.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.001" src="./assets/Cube.001.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.002" src="./assets/Cube.002.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.003" src="./assets/Cube.003.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.004" src="./assets/Cube.004.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.005" src="./assets/Cube.005.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.006" src="./assets/Cube.006.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.007" src="./assets/Cube.007.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.008" src="./assets/Cube.008.gltf"></a-asset-item>
-        #                     <a-asset-item id="Cube.009" src="./assets/Cube.009.gltf"></a-asset-item>
-        #                     <a-asset-item id="deloitte " src="./assets/deloitte .gltf"></a-asset-item>
-        #                     <a-asset-item id="DKSH" src="./assets/DKSH.gltf"></a-asset-item>
-        #                     <a-asset-item id="google " src="./assets/google .gltf"></a-asset-item>
-        #                     <a-asset-item id="meta" src="./assets/meta.gltf"></a-asset-item>
-        #                     <a-asset-item id="nike " src="./assets/nike .gltf"></a-asset-item>
-        #                     <a-asset-item id="Plane" src="./assets/Plane.gltf"></a-asset-item>
-        #                     <a-asset-item id="samsung " src="./assets/samsung .gltf"></a-asset-item>
-        #                     <a-asset-item id="six" src="./assets/six.gltf"></a-asset-item>
-        #                     <img id="sky"                 src="./resources/sky.jpg">
-        #                     <img id="icon-play"           src="./resources/play.png">
-        #                     <img id="icon-pause"          src="./resources/pause.png">
-        #                     <img id="icon-play-skip-back" src="./resources/play-skip-back.png">
-        #                     <img id="icon-mute"           src="./resources/mute.png">
-        #                     <img id="icon-volume-low"     src="./resources/volume-low.png">
-        #                     <img id="icon-volume-high"    src="./resources/volume-high.png">
-        #                 </a-assets>
-
-        #                 <!-- Entities -->
-                        
-        #                 <a-entity id="#amazon" gltf-model="#amazon"  scale="1 1 1" position="1.1128391027450562 4.325775146484375 14.492897033691406" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#apple" gltf-model="#apple"  scale="1 1 1" position="0.8324559926986694 4.1404709815979 2.7704522609710693" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#boeing" gltf-model="#boeing"  scale="1 1 1" position="0.8865522146224976 5.622444152832031 11.70455551147461" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube" gltf-model="#Cube"  scale="1 1 1" position="-0.22648416459560394 2.8150224685668945 2.756023645401001" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.001" gltf-model="#Cube.001"  scale="1 1 1" position="-0.22648416459560394 3.5149612426757812 5.844135284423828" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.002" gltf-model="#Cube.002"  scale="1 1 1" position="0.0 3.4247751235961914 -0.055373240262269974" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.003" gltf-model="#Cube.003"  scale="1 1 1" position="-0.22648416459560394 3.226078987121582 -2.9352900981903076" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.004" gltf-model="#Cube.004"  scale="1 1 1" position="-0.22648416459560394 3.5149612426757812 -6.4891157150268555" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.005" gltf-model="#Cube.005"  scale="1 1 1" position="-0.22648416459560394 2.8150224685668945 8.732294082641602" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.006" gltf-model="#Cube.006"  scale="1 1 1" position="-0.22648416459560394 2.8150224685668945 14.422906875610352" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.007" gltf-model="#Cube.007"  scale="1 1 1" position="-0.22648416459560394 3.5149612426757812 11.534748077392578" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.008" gltf-model="#Cube.008"  scale="1 1 1" position="-0.22648416459560394 3.226078987121582 -12.412830352783203" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Cube.009" gltf-model="#Cube.009"  scale="1 1 1" position="0.0 3.4247751235961914 -9.532913208007812" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#deloitte " gltf-model="#deloitte "  scale="1 1 1" position="0.7883981466293335 4.892899513244629 -2.914421558380127" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#DKSH" gltf-model="#DKSH"  scale="1 1 1" position="0.846261739730835 4.84961462020874 -12.34501838684082" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#google " gltf-model="#google "  scale="1 1 1" position="1.0024456977844238 5.113276481628418 -0.0" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#meta" gltf-model="#meta"  scale="1 1 1" position="1.2688511610031128 5.42894983291626 -9.600595474243164" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#nike " gltf-model="#nike "  scale="1 1 1" position="0.7864484786987305 5.125548362731934 5.912516117095947" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#Plane" gltf-model="#Plane"  scale="1 1 1" position="0.0 0.0 -0.0" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#samsung " gltf-model="#samsung "  scale="1 1 1" position="0.7934677004814148 4.5191802978515625 8.834068298339844" visible="true" shadow="cast: false" ></a-entity>
-        #                 <a-entity id="#six" gltf-model="#six"  scale="1 1 1" position="0.8898735046386719 5.763146877288818 -6.4537248611450195" visible="true" shadow="cast: false" ></a-entity>
-
-        #                 <!-- Camera -->
-        #                 <a-entity id="player" 
-        #                     position="0 -0.2 0" 
-        #                     movement-controls="speed: 0.10000000149011612;">
-        #                     <a-entity id="camera" 
-        #                         camera="near: 0.001" 
-        #                         position="0 1.7000000476837158 0" 
-        #                         look-controls="pointerLockEnabled: true">
-        #                             <a-entity id="cursor" cursor="fuse: false;" animation__click="property: scale; startEvents: click; easing: easeInCubic; dur: 50; from: 	0.1 0.1 0.1; to: 1 1 1"
-        #                                 position="0 0 -0.1"
-        #                                 geometry="primitive: circle; radius: 0.001;"
-        #                                 material="color: #CCC; shader: flat;"
-        #                                 >
-        #                             </a-entity>
-        #                     </a-entity>
-        #                         <a-entity id="leftHand" oculus-touch-controls="hand: left" vive-controls="hand: left"></a-entity>
-        #                         <a-entity id="rightHand" laser-controls oculus-touch-controls="hand: right" vive-controls="hand: right" ></a-entity>
-        #                 </a-entity>
-
-        #                 <!-- Lights -->
-                        
-        #                 <a-entity position="0.5248908996582031 1.1606484651565552 -0.0" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="0.0 2.9586710929870605 2.8257946968078613" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="-0.523449182510376 2.8169617652893066 6.309124946594238" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="-0.5871739387512207 3.5962722301483154 -2.9193484783172607" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="-0.25771796703338623 2.711784601211548 8.935091972351074" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="-0.25771796703338623 3.973264455795288 -6.496705055236816" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="-0.25771796703338623 2.682612657546997 11.793471336364746" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="-0.25771796703338623 2.6372766494750977 14.843578338623047" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="-0.25771796703338623 3.0482330322265625 -9.426068305969238" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-        #                 <a-entity position="-0.25771796703338623 1.8322162628173828 -12.441837310791016" light="castShadow:false; color:#ffffff; distance:40.0; type:point; intensity:1.0; shadowBias: -0.001; shadowCameraFar: 501.02; shadowCameraBottom: 12; shadowCameraFov: 101.79; shadowCameraNear: 0; shadowCameraTop: -5; shadowCameraRight: 10; shadowCameraLeft: -10; shadowRadius: 2;"></a-entity>
-
-        #                 <!-- Sky -->
-        #                 <a-sky color="#ECECEC"></a-sky>
-        #             </a-scene>
-        #         </body>
-        #     </html>
-        #     '''
-        #     )
+world_tab, screening_tab = st.tabs(["🌐 VR world", "🌱 ESG screening"])
+
+with world_tab:
+    if submit_button:
+
+        # only needed once the world is generated, so the first page load does not pay for them
+        import plotly.graph_objects as go
+        from timeseries import SeriesFrame
+        from scene import publish_scene
+
+        # streamed by Streamlit's static serving with range requests, nothing is fetched until the trailer is played
+        with st.expander("🎬 Trailer"):
+            st.html(f'<video controls preload="none" width="100%" src="{static_url(os.path.join(ROOT, "static", "trailer.mp4"))}"></video>')
+
+        # one status line per company, filled in as soon as that company is done
+        statuses = {company: st.empty() for company in options}
+        for company, status in statuses.items():
+            status.caption(f"⏳ {company}")
+
+        # the VR world is built once all companies are in
+        world = st.empty()
 
         with st.expander("For the stock market experts"):
-            # plot the differences in a single graph with multiple lines (one for each company)
-            fig = go.Figure()
-            for i in range(len(diffs)):
-                fig.add_trace(go.Scatter(x=[i for i in range(len(diffs[i]))], y=diffs[i], name=options[i]))
-            fig.update_layout(title="Differences between highs and lows", xaxis_title="Days", yaxis_title="Differences")
-            st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+            chart = st.empty()
+
+        results = {}
+
+        with st.spinner('Loading...'):
+
+            # companies are yielded as each batched round settles them, the chart is redrawn with every arrival
+            for i, company, result in iter_companies_series(findata, options, start_date, end_date, eod_store, listing_index):
+
+                if isinstance(result, Exception):
+                    statuses[company].caption(f"❌ {company}: {result}")
+                    continue
+
+                statuses[company].caption(f"✅ {company}: {len(result.bars)} days")
+                results[i] = result
+
+                # align the companies so far on one date index in the order of options, missing days are NaN
+                companies = [options[j] for j in sorted(results)]
+                frame = SeriesFrame.from_series(companies, [results[j] for j in sorted(results)])
+
+                # the difference between each high and low, divided by the largest difference of the company
+                diffs = frame.normalized_spread()
+
+                # plot the differences in a single graph with multiple lines (one for each company)
+                fig = go.Figure()
+                for j in range(len(diffs)):
+                    fig.add_trace(go.Scatter(x=frame.dates, y=diffs[j], name=companies[j], connectgaps=True))
+                fig.update_layout(title="Differences between highs and lows", xaxis_title="Days", yaxis_title="Differences")
+                chart.plotly_chart(fig, use_container_width=True)
+
+        if len(results) > 0:
+            # one merged mesh with a row of bars per company, heights driven by the normalized spreads
+            with world.container():
+                components.html(publish_scene(companies, diffs), height=390)
+
+######################### ESG SCREENING #########################
+
+with screening_tab:
+    # screening.py pulls the ESG and regulatory data of a whole portfolio in chunked, concurrent requests
+    from screening import DATASETS, INSTRUMENT_DATASETS, PART_FORMAT, read_portfolio, run_dir, prune, screen, read_dataset, combine
+
+    with st.form(key='Screening'):
+        portfolio_file = st.file_uploader("Portfolio: a CSV with an id (and optional scheme) column, or one id per line", type=["csv", "txt"])
+        scheme = st.selectbox("Scheme of ids without one", ["ISIN", "VALOR", "VALOR_BC", "LEI"])
+        datasets = st.multiselect("Datasets", list(DATASETS), default=INSTRUMENT_DATASETS)
+        screen_button = st.form_submit_button(label='Screen portfolio', type="primary")
+
+    if screen_button and portfolio_file is not None and len(datasets) > 0:
+        portfolio = read_portfolio(portfolio_file.getvalue().decode("utf-8-sig").splitlines(), scheme)
+        # results live below a directory of this session, older sessions are cleaned up on the way
+        session = st.session_state.setdefault("screening_session", uuid.uuid4().hex[:16])
+        out_dir = run_dir(session, portfolio_file.getvalue(), scheme, datasets)
+        prune()
+        progress = st.progress(0.0)
+        summary = screen(findata, portfolio, datasets, out_dir,
+                         progress=lambda done, total: progress.progress(done / total, text=f"{done}/{total} requests"))
+        # kept in the session, so the results survive the reruns triggered by the download buttons
+        st.session_state["screening"] = (out_dir, datasets, summary)
+
+    if "screening" in st.session_state:
+        out_dir, datasets, summary = st.session_state["screening"]
+        st.caption(f"{summary['requests']} requests in {summary['seconds']}s")
+        for dataset in datasets:
+            st.markdown(f"**{dataset}**: {summary[dataset]['rows']} rows, {summary[dataset]['failed']} ids failed")
+            st.dataframe(read_dataset(out_dir, dataset, limit=100), use_container_width=True)
+            # the parts are only combined when the button is clicked
+            st.download_button(f"Download {dataset}.{PART_FORMAT}", functools.partial(combine, out_dir, dataset),
+                               file_name=f"{dataset}.{PART_FORMAT}", key=dataset)
+
+# upstream request metrics of this server process: with FINDATA_DEBUG_PANEL=1 set on the server,
+# open the app with ?debug=1 to see them. Without it the panel is never shown, whatever the URL says.
+if DEBUG_PANEL and st.query_params.get("debug") == "1":
+    with st.sidebar.expander("Debug: upstream requests", expanded=True):
+        st.dataframe(findata.metrics.summary(), use_container_width=True)
+        if metrics_server() is not None:
+            st.caption(f"Prometheus format at /metrics on port {metrics_server().server_port}")
@@ -0,0 +1,53 @@
+import os
+import json
+import logging
+import functools
+import threading
+from static_server import ROOT, static_url
+
+# Runtime side of build_assets.py: URLs of the model bundle and the environment faces, all content
+# hashed below ./static where Streamlit serves them. The build takes a fraction of a second, so it is
+# run on first use when it has not been run yet (static/assets is not checked in).
+
+MANIFEST = os.path.join(ROOT, "static", "assets", "manifest.json")
+ENV_FACES = ["posx", "negx", "posy", "negy", "posz", "negz"]
+
+_build_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def manifest() -> dict:
+    with _build_lock:
+        if not os.path.exists(MANIFEST):
+            try:
+                from build_assets import build
+                build()
+            except Exception as err:
+                logging.warning(f"Error - building the 3D assets, the world has no logos: {err}")
+                return {}
+    with open(MANIFEST, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _url(filename:str) -> str:
+    return static_url(os.path.join(os.path.dirname(MANIFEST), filename))
+
+
+def model_node(name:str):
+    # name of the bundle node holding the model of a company or asset name ("Google", "cube.001"), None if there is none
+    name = name.strip().lower()
+    return name if name in manifest().get("models", {}) else None
+
+
+def bundle_url():
+    # URL of the single GLB holding every model, None if the build failed
+    built = manifest().get("bundle")
+    return _url(built) if built else None
+
+
+def env_urls():
+    # URLs of the cube map faces in ENV_FACES order, None if the build failed
+    env = manifest().get("env", {})
+    if not all(face in env for face in ENV_FACES):
+        return None
+    return [_url(env[face]) for face in ENV_FACES]
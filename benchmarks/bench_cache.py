@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+from cache import ResponseCache, CachedResponse, STALE_KEEP
+
+# Write many distinct responses (never expiring, like past EoD ranges) through a ResponseCache with small
+# budgets and check that both tiers stay within them, that the most recently used responses survive and
+# that a cache file written before the sweep existed is migrated and swept on open.
+#
+#   python benchmarks/bench_cache.py [responses] [body_kb]
+
+
+def disk_bytes(path:str) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COALESCE(SUM(length(body)), 0) FROM responses").fetchone()[0]
+
+
+def main():
+    responses = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    body_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    memory_budget, disk_budget = 1024 * 1024, 4 * 1024 * 1024
+    cache_dir = tempfile.mkdtemp(prefix="bench_cache_")
+    path = os.path.join(cache_dir, "responses.sqlite3")
+
+    store = ResponseCache(cache_dir, mode="live", memory_bytes=memory_budget, disk_bytes=disk_budget)
+    start = time.perf_counter()
+    for i in range(responses):
+        # incompressible enough that the disk budget is reached
+        store.put(f"key{i}", CachedResponse(200, os.urandom(body_kb * 512).hex().encode()), None)
+        # an old response that keeps being read stays, it is used more recently than the ones written since
+        assert store.get("key0") is not None, i
+    seconds = time.perf_counter() - start
+    print(f"{responses} responses of {body_kb} kB in {seconds:.2f}s")
+    print(f"  memory: {store._memory_size / 1e6:.2f} MB in {len(store._memory)} entries (budget {memory_budget / 1e6:.2f} MB)")
+    print(f"  disk: {disk_bytes(path) / 1e6:.2f} MB compressed (budget {disk_budget / 1e6:.2f} MB, swept every {cache.SWEEP_EVERY} writes)")
+    assert store._memory_size <= memory_budget
+    # between sweeps the disk tier may run over by at most SWEEP_EVERY responses
+    assert disk_bytes(path) <= disk_budget + cache.SWEEP_EVERY * body_kb * 1024
+    assert store.get(f"key{responses - 1}") is not None
+    assert store._db.execute("SELECT COUNT(*) FROM responses WHERE key = 'key0'").fetchone()[0] == 1
+    store.close()
+
+    # a file in the old layout, without the used column, with a response expired for longer than STALE_KEEP
+    old_dir = tempfile.mkdtemp(prefix="bench_cache_old_")
+    with sqlite3.connect(os.path.join(old_dir, "responses.sqlite3")) as db:
+        db.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, status INTEGER, body BLOB, expires REAL)")
+        db.execute("INSERT INTO responses VALUES ('old', 200, x'00', ?)", (time.time() - STALE_KEEP - 1,))
+        db.execute("INSERT INTO responses VALUES ('past', 200, x'00', NULL)")
+    store = ResponseCache(old_dir, mode="live")
+    assert store.get_stale("old") is None
+    assert store._db.execute("SELECT COUNT(*) FROM responses WHERE key = 'past'").fetchone()[0] == 1
+    store.close()
+    print("  old cache file migrated, long expired response removed")
+
+
+if __name__ == "__main__":
+    main()
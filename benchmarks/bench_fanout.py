@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import ResponseCache
+from findata import FinancialDataAPI, companies_series, iter_companies_series, print_object_attributes_text, print_object_attributes_timeseries
+
+# Compare the sequential submit loop with FinancialDataAPI.map_concurrent and the batched
+# companies_series against a local stub where every company answers with a different latency,
+# and check that iter_companies_series yields the fastest company long before the slowest one.
+#
+#   python benchmarks/bench_fanout.py
+
+COMPANIES = ['DKSH', 'Tesla', 'Amazon', 'Nike', 'Apple', 'Google', 'Samsung', 'Meta', 'Boeing', 'SIX']
+LATENCY = {company: 0.02 * (i + 1) for i, company in enumerate(COMPANIES)}
+VALORS = {str(1000 + i): company for i, company in enumerate(COMPANIES)}
+
+
+def company_highs_lows(api:FinancialDataAPI, company:str, start_date:str, end_date:str):
+    # the submit loop the dashboard used to run per company: one search, then its hits in order until one has EoD data
+    valors, bcs = print_object_attributes_text([], [], api.text_search(company)) or ([], [])
+    for valor, bc in zip(valors, bcs):
+        obj = api.listing_EoDTimeseries("VALOR_BC", [f"{valor}_{bc}"], start_date, end_date)
+        highs, lows = print_object_attributes_timeseries([], [], obj) or ([], [])
+        if len(highs) > 0 or len(lows) > 0:
+            return highs, lows
+    return [], []
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    eod_calls = 0
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        if url.path.endswith("/searchInstruments"):
+            company = query["query"]
+            valor = next(v for v, c in VALORS.items() if c == company)
+            body = {"data": {"searchInstruments": [{"hit": {"valor": valor, "bc": "4"}}]}}
+            latency = LATENCY[company]
+        else:
+            ids = query["ids"].split(",")
+            bars = [{"sessionDate": f"2023-01-{day:02d}", "high": 100.0 + day, "low": 90.0 + day} for day in range(1, 29)]
+            body = {"data": {"listings": [{"requestedId": id, "marketData": {"eodTimeseries": bars}} for id in ids]}}
+            latency = max(LATENCY[VALORS[id.split("_")[0]]] for id in ids)
+            StubHandler.eod_calls += 1
+
+        time.sleep(latency)
+        content = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    def fresh_api():
+        return FinancialDataAPI(cache=ResponseCache(cache_dir=None), url=url, certificate_path=None, max_workers=len(COMPANIES))
+
+    api = fresh_api()
+    start = time.perf_counter()
+    for company in COMPANIES:
+        company_highs_lows(api, company, "2023-01-01", "2023-01-31")
+    sequential = time.perf_counter() - start
+
+    api = fresh_api()
+    start = time.perf_counter()
+    api.map_concurrent(lambda company: company_highs_lows(api, company, "2023-01-01", "2023-01-31"), COMPANIES)
+    concurrent = time.perf_counter() - start
+    concurrent_calls = StubHandler.eod_calls
+
+    api = fresh_api()
+    start = time.perf_counter()
+    companies_series(api, COMPANIES, "2023-01-01", "2023-01-31")
+    batched = time.perf_counter() - start
+    batched_calls = StubHandler.eod_calls - concurrent_calls
+
+    # time to first content: when each company is yielded
+    api = fresh_api()
+    start = time.perf_counter()
+    arrivals = [time.perf_counter() - start for _ in iter_companies_series(api, COMPANIES, "2023-01-01", "2023-01-31")]
+    streamed_calls = StubHandler.eod_calls - concurrent_calls - batched_calls
+
+    server.shutdown()
+
+    print(f"companies:              {len(COMPANIES)}")
+    print(f"sum of latencies:       {2 * sum(LATENCY.values()):.3f}s")
+    print(f"slowest company:        {2 * max(LATENCY.values()):.3f}s")
+    print(f"sequential:             {sequential:.3f}s")
+    print(f"map_concurrent:         {concurrent:.3f}s")
+    print(f"batched EoD:            {batched:.3f}s ({batched_calls} EoD request(s))")
+    print(f"streamed: first company {arrivals[0]:.3f}s, last {arrivals[-1]:.3f}s ({streamed_calls} EoD request(s))")
+    # the fastest company (search and EoD) shows long before the slowest one is done
+    assert len(arrivals) == len(COMPANIES)
+    assert arrivals[0] < arrivals[-1] / 2, arrivals
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Load test of the dashboard: N sessions, C of them at a time, each opening the app and submitting a random
+# selection of companies and dates through Streamlit's AppTest, against the SIX API simulator.
+# Reports p50/p95/p99 per phase, upstream calls per endpoint, the hit rates of the EoD store, the listing index
+# and the response cache, and memory, and writes everything as JSON so runs can be compared across releases.
+# Reports go to benchmarks/results/ (ignored by git) unless --out says otherwise.
+#
+#   python benchmarks/bench_load.py [--sessions 20] [--concurrency 5] [--latency 0.05] [--out results.json]
+
+COMPANIES = ['DKSH', 'Tesla', 'Amazon', 'Nike', 'Apple', 'Google', 'Samsung', 'Meta', 'Boeing', 'SIX']
+START_DATES = [datetime.date(2022, 7, 1), datetime.date(2022, 1, 3), datetime.date(2022, 10, 3), datetime.date(2023, 1, 2)]
+END_DATE = datetime.date(2023, 3, 22)
+
+
+def percentiles(values:list) -> dict:
+    if len(values) == 0:
+        return {"count": 0}
+    values = sorted(values)
+    def at(q):
+        return round(1000 * values[min(len(values) - 1, int(q * len(values)))], 1)
+    return {"count": len(values), "p50_ms": at(0.5), "p95_ms": at(0.95), "p99_ms": at(0.99),
+            "mean_ms": round(1000 * sum(values) / len(values), 1), "max_ms": round(1000 * values[-1], 1)}
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1e6 if sys.platform == "darwin" else 1e3), 1)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def session(AppTest, seed:int, timeout:float) -> dict:
+    # one user: open the app, pick companies and dates, submit
+    rng = random.Random(seed)
+    companies = rng.sample(COMPANIES, rng.randint(2, 6))
+    start_date = rng.choice(START_DATES)
+
+    timings = {}
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    timings["open"] = time.perf_counter() - start
+    if at.exception:
+        return {"error": str(at.exception), **timings}
+
+    at.sidebar.multiselect[0].set_value(companies)
+    at.sidebar.date_input[0].set_value(start_date)
+    at.sidebar.date_input[1].set_value(END_DATE)
+    at.sidebar.button[0].click()
+    start = time.perf_counter()
+    at.run()
+    timings["submit"] = time.perf_counter() - start
+    if at.exception:
+        return {"error": str(at.exception), **timings}
+
+    captions = [caption.value for caption in at.caption]
+    timings["companies"] = len(companies)
+    timings["failed_companies"] = sum(1 for caption in captions if caption.startswith("❌"))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard against the SIX API simulator")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="mean extra latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream 503s")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds a script run may take")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join(ROOT, "benchmarks", "results", f"load-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"))
+    args = parser.parse_args()
+
+    # configure the app for the simulator before anything imports findata
+    from simulator import Simulator, start_simulator
+    server = start_simulator(port=0, simulator=Simulator(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed))
+    os.environ.update(FINDATA_URL=f"http://127.0.0.1:{server.server_port}", FINDATA_CERT_DIR="", FINDATA_PREFETCH="0",
+                      FINDATA_CACHE_DIR=tempfile.mkdtemp(prefix="bench_load_"))
+    os.chdir(ROOT)
+
+    from streamlit.testing.v1 import AppTest
+    from metrics import METRICS
+
+    rss_before = max_rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda seed: session(AppTest, seed, args.timeout), range(args.seed, args.seed + args.sessions)))
+    wall = time.perf_counter() - start
+
+    upstream = server.simulator.stats()
+    # the EoD store and the listing index answer before the response cache is asked, so each layer is reported
+    def hits(counter:dict) -> dict:
+        hit = sum(n for (_, result), n in counter.items() if result == "hit")
+        miss = sum(n for (_, result), n in counter.items() if result == "miss")
+        return {"hits": hit, "misses": miss, "hit_rate": round(hit / max(1, hit + miss), 3)}
+    cache = {"response_cache": hits(METRICS.cache),
+             **{store: hits({key: n for key, n in METRICS.local.items() if key[0] == store}) for store in ("eod_store", "listing_index")}}
+    report = {
+        "benchmark": "load",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "wall_seconds": round(wall, 2),
+        "sessions_per_second": round(args.sessions / wall, 2),
+        "errors": [result["error"] for result in results if "error" in result],
+        "failed_companies": sum(result.get("failed_companies", 0) for result in results),
+        "latency": {phase: percentiles([result[phase] for result in results if phase in result]) for phase in ("open", "submit")},
+        "upstream": {"total_calls": upstream["total_calls"], "calls_per_session": round(upstream["total_calls"] / args.sessions, 2),
+                     "calls": upstream["calls"], "bytes": sum(upstream["bytes"].values()), "statuses": upstream["statuses"]},
+        "cache": cache,
+        "memory": {"max_rss_mb": max_rss_mb(), "max_rss_growth_mb": round(max_rss_mb() - rss_before, 1)},
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{args.sessions} sessions, {args.concurrency} concurrent, {wall:.1f}s, {len(report['errors'])} errors")
+    for phase, stats in report["latency"].items():
+        print(f"  {phase:<7} p50 {stats.get('p50_ms')} ms   p95 {stats.get('p95_ms')} ms   p99 {stats.get('p99_ms')} ms")
+    print(f"  upstream: {upstream['total_calls']} calls ({report['upstream']['calls_per_session']} per session), "
+          f"hit rates: " + ", ".join(f"{layer} {stats['hit_rate']}" for layer, stats in cache.items()))
+    print(f"  memory:   max RSS {report['memory']['max_rss_mb']} MB")
+    print(f"  written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import socket
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from static_server import ROOT, static_url
+
+# Stream trailer.mp4 the way the page does, from Streamlit's static file serving at app/static/, to many
+# concurrent clients, half of them seeking with range requests the way a <video> element does. Reports
+# the growth of the Streamlit server's resident memory and open descriptors against reading the whole
+# file per click as the submit handler used to.
+#
+#   python benchmarks/bench_media.py [clients]
+
+FILE = os.path.join(ROOT, "static", "trailer.mp4")
+PATH = "/" + static_url(FILE)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def status_kb(pid:int, field:str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def descriptors(pid:int) -> int:
+    return len(os.listdir(f"/proc/{pid}/fd"))
+
+
+def start_streamlit(port:int) -> subprocess.Popen:
+    # no session is opened, so the app script itself never runs and nothing reaches the upstream API
+    env = dict(os.environ, FINDATA_PREFETCH="0")
+    process = subprocess.Popen([sys.executable, "-m", "streamlit", "run", "app.py", "--server.headless", "true",
+                                "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/_stcore/health")
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("streamlit did not start")
+
+
+def fetch(port:int, ranged:bool) -> int:
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    received = 0
+    if ranged:
+        # the player asks for the start, then seeks to the middle and to the end
+        for header in ["bytes=0-65535", "bytes=80000-120000", "bytes=-4096"]:
+            connection.request("GET", PATH, headers={"Range": header})
+            response = connection.getresponse()
+            assert response.status == 206, response.status
+            assert response.getheader("Content-Range", "").startswith("bytes "), response.getheader("Content-Range")
+            received += len(response.read())
+    else:
+        connection.request("GET", PATH)
+        response = connection.getresponse()
+        assert response.status == 200, response.status
+        assert response.getheader("Content-Type") == "video/mp4", response.getheader("Content-Type")
+        while True:
+            chunk = response.read(64 * 1024)
+            if not chunk:
+                break
+            received += len(chunk)
+    connection.close()
+    return received
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    size = os.path.getsize(FILE)
+    port = free_port()
+    process = start_streamlit(port)
+    try:
+        # one warm up request, so imports done on first use are not counted
+        fetch(port, True)
+        rss_before, fds_before = status_kb(process.pid, "VmRSS"), descriptors(process.pid)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            received = sum(executor.map(lambda i: fetch(port, i % 2 == 0), range(clients)))
+        seconds = time.perf_counter() - start
+        time.sleep(0.5)
+        rss_after, fds_after = status_kb(process.pid, "VmRSS"), descriptors(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f"trailer.mp4 at {PATH}: {size} bytes, {clients} clients ({clients // 2} seeking)")
+    print(f"  streamed: {received} bytes in {seconds:.2f}s, server RSS {(rss_after - rss_before) / 1e3:+.1f} MB, "
+          f"open descriptors {fds_after - fds_before:+d}")
+    print(f"  read per submit: {clients * size / 1e6:.1f} MB kept referenced by {clients} sessions")
+    # descriptors of finished responses are closed, not kept per client
+    assert fds_after - fds_before < clients // 4, fds_after - fds_before
+
+
+if __name__ == "__main__":
+    main()
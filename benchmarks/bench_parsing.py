@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import time
+import random
+import datetime
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from findata import print_object_attributes_timeseries
+from parsing import parse_eod
+
+# Decode a large synthetic eodTimeseries payload with the SimpleNamespace walkers and with parsing.parse_eod,
+# reporting time, peak allocations and what the result keeps allocated for each.
+#
+#   python benchmarks/bench_parsing.py [listings] [days]
+
+
+def synthetic_payload(listings:int, days:int) -> bytes:
+    start = datetime.date(2015, 1, 1)
+    data = []
+    for i in range(listings):
+        bars = []
+        price = 100.0
+        for day in range(days):
+            price *= 1 + random.uniform(-0.02, 0.02)
+            bars.append({
+                "sessionDate": (start + datetime.timedelta(days=day)).isoformat(),
+                "open": price, "high": price * 1.01, "low": price * 0.99, "close": price,
+                "volume": random.randint(1000, 100000), "currency": "USD", "marketCode": "XNAS",
+            })
+        data.append({"requestedId": f"{1000 + i}_4", "requestedScheme": "VALOR_BC", "lookupStatus": "FOUND",
+                     "marketData": {"eodTimeseries": bars}})
+    return json.dumps({"data": {"listings": data}}).encode()
+
+
+def walkers(content:bytes):
+    obj = json.loads(content, object_hook=lambda d: SimpleNamespace(**d))
+    return print_object_attributes_timeseries([], [], obj)
+
+
+def records(content:bytes):
+    return parse_eod(content)
+
+
+def measure(func, content:bytes):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(content)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, retained
+
+
+def main():
+    listings = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 1500
+    content = synthetic_payload(listings, days)
+
+    print(f"payload: {listings} listings x {days} days, {len(content) / 1e6:.1f} MB")
+    for name, func in [("SimpleNamespace walkers", walkers), ("parse_eod records", records)]:
+        elapsed, peak, retained = measure(func, content)
+        print(f"{name:<26} {elapsed:8.3f}s  peak {peak / 1e6:8.1f} MB  retained {retained / 1e6:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Time the Streamlit script headless with AppTest: the first run of a session (cold), plain reruns
+# and a submit against the SIX API simulator, plus the memory each session allocates.
+# Process wide resources are created by the first session only, later sessions reuse them.
+#
+#   python benchmarks/bench_rerun.py [sessions] [reruns]
+
+from simulator import start_simulator
+
+server = start_simulator(port=0)
+os.environ.update(FINDATA_URL=f"http://127.0.0.1:{server.server_port}", FINDATA_CERT_DIR="", FINDATA_PREFETCH="0",
+                  FINDATA_CACHE_DIR=tempfile.mkdtemp(prefix="bench_rerun_"))
+
+from streamlit.testing.v1 import AppTest
+
+
+def timed(at) -> float:
+    start = time.perf_counter()
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception)
+    return time.perf_counter() - start
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    reruns = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    os.chdir(ROOT)
+
+    tracemalloc.start()
+    for session in range(sessions):
+        before = tracemalloc.get_traced_memory()[0]
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+        first = timed(at)
+        rerun = sum(timed(at) for _ in range(reruns)) / reruns
+        at.sidebar.button[0].click()
+        submit = timed(at)
+        allocated = tracemalloc.get_traced_memory()[0] - before
+        print(f"session {session}: first run {1000 * first:7.1f} ms   rerun {1000 * rerun:6.1f} ms   "
+              f"submit {1000 * submit:7.1f} ms   {allocated / 1e6:6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
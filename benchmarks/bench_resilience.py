@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import threading
+import tempfile
+import statistics
+import email.utils
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import ResponseCache, CachedResponse, cache_key
+from findata import FinancialDataAPI, companies_series
+from eodstore import EodStore
+from resolver import ListingIndex
+from simulator import Simulator, start_simulator
+from resilience import TokenBucket, CircuitBreaker, CircuitOpen, SingleFlight, backoff_delay, gives_up, retry_after_seconds
+
+# Run FinancialDataAPI against a local stub that injects 429s (with Retry-After), 503s and outages,
+# once without the request policy (no retries) and once with it, and check deduplication of
+# identical concurrent requests and stale serving while the circuit breaker is open.
+# The building blocks are checked with assertions first, so a broken policy fails the run
+# instead of printing numbers.
+#
+#   python benchmarks/bench_resilience.py [requests]
+
+
+class FaultHandler(BaseHTTPRequestHandler):
+    # fraction of requests answered with 429 / 503, latency of every answer, and a switch for a full outage
+    rate_limited = 0.1
+    unavailable = 0.2
+    latency = 0.01
+    retry_after = "0.05"
+    down = False
+    calls = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with FaultHandler.lock:
+            FaultHandler.calls += 1
+        time.sleep(self.latency)
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+
+        draw = random.random()
+        if self.down or draw < self.unavailable:
+            return self._send(503, b"unavailable")
+        if draw < self.unavailable + self.rate_limited:
+            return self._send(429, b"slow down", {"Retry-After": self.retry_after})
+        return self._send(200, json.dumps({"data": {"searchInstruments": [{"hit": {"valor": "1000", "bc": "4", "query": query.get("query")}}]}}).encode())
+
+    def _send(self, status:int, content:bytes, headers:dict = {}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+######################### checks #########################
+
+def check_retry_after() -> None:
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("") is None
+    assert retry_after_seconds("soon") is None
+    assert retry_after_seconds("3") == 3.0
+    assert retry_after_seconds("-1") == 0.0
+    assert 55 < retry_after_seconds(email.utils.formatdate(time.time() + 60, usegmt=True)) <= 60
+    assert retry_after_seconds(email.utils.formatdate(time.time() - 60, usegmt=True)) == 0.0
+    # waited for up to the cap, given up on above it
+    assert backoff_delay(0, 5.0) == 5.0
+    assert not gives_up(None) and not gives_up(10.0) and gives_up(10.5)
+
+
+def check_breaker() -> None:
+    breaker = CircuitBreaker(failures=2, reset_timeout=0.05)
+    assert breaker.allow() and breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed", "a success resets the failure count"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow(), "only one probe while half open"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow(), "a failed probe reopens"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.allow()
+
+
+def check_singleflight() -> None:
+    flight, calls, callers = SingleFlight(), [], 8
+    barrier = threading.Barrier(callers)
+
+    def call(func):
+        barrier.wait()
+        try:
+            return flight.do("key", func)
+        except ValueError as err:
+            return err
+
+    def slow(result):
+        def func():
+            calls.append(1)
+            time.sleep(0.1)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return func
+
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        results = list(executor.map(call, [slow("answer")] * callers))
+    assert len(calls) == 1 and results == ["answer"] * callers, (len(calls), results)
+
+    # a failure reaches every waiting caller, and the key is free again afterwards
+    calls.clear()
+    failure = ValueError("upstream")
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        results = list(executor.map(call, [slow(failure)] * callers))
+    assert len(calls) == 1 and all(result is failure for result in results)
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def check_api(url:str) -> None:
+    def api(**kwargs):
+        return FinancialDataAPI(cache=ResponseCache(cache_dir=None), url=url, certificate_path=None, **kwargs)
+
+    end_point, stale = "/v1/searchInstruments", CachedResponse(200, b'{"data": {"stale": true}}')
+    FaultHandler.unavailable, FaultHandler.rate_limited = 1.0, 0.0
+    try:
+        # an expired entry is served when the retries run out, without one the failed response is returned
+        client = api(max_retries=2)
+        client.cache.put(cache_key(end_point, {"query": "cached"}), stale, ttl=0)
+        FaultHandler.calls = 0
+        assert client.http_request(end_point, {"query": "cached"}).content == stale.content
+        assert FaultHandler.calls == 3 and sum(client.metrics.stale.values()) >= 1
+        assert client.http_request(end_point, {"query": "uncached"}).status_code == 503
+
+        # while the breaker is open nothing goes upstream, stale entries are still served
+        client = api(max_retries=0, breaker=CircuitBreaker(failures=1, reset_timeout=60))
+        client.cache.put(cache_key(end_point, {"query": "cached"}), stale, ttl=0)
+        client.http_request(end_point, {"query": "other"})
+        assert client.breaker.state == "open"
+        FaultHandler.calls = 0
+        assert client.http_request(end_point, {"query": "cached"}).content == stale.content
+        try:
+            client.http_request(end_point, {"query": "other"})
+            raise AssertionError("expected CircuitOpen")
+        except CircuitOpen:
+            pass
+        assert FaultHandler.calls == 0
+
+        # a Retry-After above the backoff cap is not retried, the stale entry is served right away
+        FaultHandler.unavailable, FaultHandler.rate_limited, FaultHandler.retry_after = 0.0, 1.0, "120"
+        client = api(max_retries=3)
+        client.cache.put(cache_key(end_point, {"query": "cached"}), stale, ttl=0)
+        FaultHandler.calls = 0
+        start = time.perf_counter()
+        assert client.http_request(end_point, {"query": "cached"}).content == stale.content
+        assert client.http_request(end_point, {"query": "uncached"}).status_code == 429
+        assert FaultHandler.calls == 2 and time.perf_counter() - start < 1
+    finally:
+        FaultHandler.unavailable, FaultHandler.rate_limited, FaultHandler.retry_after = 0.2, 0.1, "0.05"
+
+def check_outage_marks() -> None:
+    # an EoD request failing during an outage must not mark the listing as empty: once the upstream is back
+    # the company is found again, instead of being skipped for resolver.EMPTY_TTL
+    simulator = Simulator(latency=0, jitter=0, empty_rate=0)
+    server = start_simulator(port=0, simulator=simulator)
+    folder = tempfile.mkdtemp(prefix="bench_resilience_")
+    store, index = EodStore(folder), ListingIndex(folder)
+    api = FinancialDataAPI(cache=ResponseCache(cache_dir=None), url=f"http://127.0.0.1:{server.server_port}", certificate_path=None,
+                           max_retries=0, breaker=CircuitBreaker(failures=10 ** 6))
+    window = ("2023-01-02", "2023-01-31")
+    try:
+        # searches work, every EoD request fails
+        original = simulator.handle
+        simulator.handle = lambda path: (503, {}, b"{}") if "/eodTimeseries" in path else original(path)
+        failed = companies_series(api, ["Apple"], *window, store, index)[0]
+        assert isinstance(failed, Exception) and "upstream unavailable" in str(failed), failed
+        assert len(index.candidates("Apple", *window)) > 0, "a failed request marked the listings empty"
+
+        simulator.handle = original
+        found = companies_series(api, ["Apple"], *window, store, index)[0]
+        assert not isinstance(found, Exception) and len(found.bars) > 0, found
+
+        # the whole upstream down, the search included: reported as a failure, not as "No listing found"
+        simulator.error_rate = 1.0
+        failed = companies_series(api, ["Google"], *window, store, index)[0]
+        assert isinstance(failed, Exception) and "upstream unavailable" in str(failed), failed
+    finally:
+        store.close()
+        index.close()
+        server.shutdown()
+
+######################### benchmark #########################
+
+def run(api:FinancialDataAPI, queries:list) -> dict:
+    FaultHandler.calls = 0
+    latencies = []
+
+    def one(query):
+        start = time.perf_counter()
+        try:
+            r = api.http_request("/v1/searchInstruments", {"query": query})
+            success = r.status_code == 200
+        except Exception:
+            success = False
+        latencies.append(time.perf_counter() - start)
+        return success
+
+    ok = sum(1 for success in api.map_concurrent(one, queries) if success is True)
+    latencies.sort()
+    return {"ok": ok, "upstream calls": FaultHandler.calls,
+            "p50 ms": round(1000 * statistics.median(latencies), 1),
+            "p95 ms": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 1)}
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    logging.disable(logging.WARNING)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FaultHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    check_retry_after()
+    check_breaker()
+    check_singleflight()
+    check_api(url)
+    check_outage_marks()
+    print("checks passed: Retry-After parsing, breaker transitions, singleflight, stale serving, outages do not mark listings empty")
+
+    def api(**kwargs):
+        return FinancialDataAPI(cache=ResponseCache(cache_dir=None), url=url, certificate_path=None, **kwargs)
+
+    queries = [f"company {i}" for i in range(requests)]
+    unlimited = dict(limiter=TokenBucket(rate=10000, burst=10000), breaker=CircuitBreaker(failures=10 ** 6))
+    print(f"{requests} distinct requests, {FaultHandler.unavailable:.0%} 503 and {FaultHandler.rate_limited:.0%} 429")
+    without, with_policy = run(api(max_retries=0, **unlimited), queries), run(api(max_retries=4, limiter=TokenBucket(rate=200, burst=20)), queries)
+    print(f"  no policy:   {without}")
+    print(f"  with policy: {with_policy}")
+    assert with_policy["ok"] > without["ok"]
+
+    # identical requests in flight at the same time share one upstream call
+    FaultHandler.unavailable, FaultHandler.rate_limited, FaultHandler.latency = 0, 0, 0.2
+    identical = run(api(max_workers=32), ['DKSH'] * requests)
+    print(f"{requests} identical concurrent requests: {identical}")
+    assert identical["ok"] == requests and identical["upstream calls"] < requests / 4
+
+    # during an outage, expired entries are served and the breaker stops calling upstream
+    FaultHandler.latency, FaultHandler.down = 0.01, True
+    outage = api(breaker=CircuitBreaker(failures=3, reset_timeout=60))
+    for query in queries:
+        outage.cache.put(cache_key("/v1/searchInstruments", {"query": query}), CachedResponse(200, b'{"data": {}}'), ttl=0)
+    during = run(outage, queries)
+    print(f"{requests} expired requests during an outage: {during}, breaker {outage.breaker.state}, "
+          f"stale served {sum(outage.metrics.stale.values())}")
+    assert during["ok"] == requests and outage.breaker.state == "open" and during["upstream calls"] < requests
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import json
+import time
+import struct
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scene import build_scene
+
+# Scene build time, GLB size and draw calls for growing numbers of companies and days.
+#
+#   python benchmarks/bench_scene.py
+
+
+def draw_calls(glb:bytes) -> int:
+    length, = struct.unpack_from("<I", glb, 12)
+    gltf = json.loads(glb[20:20 + length])
+    return sum(len(mesh["primitives"]) for mesh in gltf.get("meshes", []))
+
+
+def main():
+    print(f"{'companies':>9} {'days':>7} {'build':>9} {'size':>9} {'draw calls':>10}")
+    for companies in [1, 6, 10, 50]:
+        for days in [30, 250, 2500, 25000]:
+            values = np.random.rand(companies, days)
+            values[:, ::7] = np.nan
+            start = time.perf_counter()
+            glb = build_scene([f"company {i}" for i in range(companies)], values)
+            elapsed = time.perf_counter() - start
+            print(f"{companies:>9} {days:>7} {elapsed * 1000:>7.1f}ms {len(glb) / 1000:>7.0f}KB {draw_calls(glb):>10}")
+
+
+if __name__ == "__main__":
+    main()
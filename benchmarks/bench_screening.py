@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import threading
+import tracemalloc
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import ResponseCache
+from findata import FinancialDataAPI
+from resilience import TokenBucket
+from screening import INSTRUMENT_DATASETS, screen, read_dataset
+
+# Screen a synthetic portfolio against a stub answering every ESG / regulatory endpoint with a nested
+# record per id, at increasing concurrency, reporting throughput, and the peak memory for growing portfolios.
+#
+#   python benchmarks/bench_screening.py [ids]
+
+LATENCY = 0.05
+
+
+# one nested ESG record, the stub only swaps in the requested id so it costs little CPU next to the client
+RECORD = json.dumps({"requestedId": "{id}", "requestedScheme": "ISIN", "lookupStatus": "FOUND",
+                     "esg": {"reportingDate": "2022-12-31", "score": 0.5,
+                             "indicators": {f"pai{i}": {"value": random.random(), "unit": "t"} for i in range(20)}},
+                     "sources": ["SIX", "issuer"]})
+
+
+class EsgHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+        entries = ",".join(RECORD.replace('"{id}"', json.dumps(id)) for id in query["ids"].split(","))
+        content = f'{{"data": {{"instruments": [{entries}]}}}}'.encode()
+        time.sleep(LATENCY)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(url:str, portfolio:dict, workers:int) -> tuple:
+    api = FinancialDataAPI(cache=ResponseCache(cache_dir=None, memory_entries=0), url=url, certificate_path=None,
+                           max_workers=workers, limiter=TokenBucket(rate=10000, burst=10000))
+    out_dir = tempfile.mkdtemp(prefix="bench_screening_")
+    return screen(api, portfolio, out_dir=out_dir), out_dir
+
+
+def main():
+    ids = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EsgHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"{ids} ids x {len(INSTRUMENT_DATASETS)} datasets, {1000 * LATENCY:.0f} ms per request")
+    for workers in (1, 4, 16):
+        summary, out_dir = run(url, {"ISIN": [f"CH{i:010d}" for i in range(ids)]}, workers)
+        rows = sum(summary[dataset]["rows"] for dataset in INSTRUMENT_DATASETS)
+        print(f"  {workers:>2} workers: {summary['requests']} requests in {summary['seconds']:6.2f}s, "
+              f"{rows / summary['seconds']:6.0f} rows/s, {len(read_dataset(out_dir, INSTRUMENT_DATASETS[0]))} rows read back")
+
+    # peak memory does not grow with the portfolio
+    for size in (ids, 4 * ids):
+        tracemalloc.start()
+        run(url, {"ISIN": [f"CH{i:010d}" for i in range(size)]}, 16)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {size:>6} ids: peak {peak / 1e6:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import os
+import re
+import sys
+import json
+import time
+import base64
+import hashlib
+import numpy as np
+from scene import (BufferBuilder, pack_glb, FLOAT, UNSIGNED_BYTE, UNSIGNED_SHORT, UNSIGNED_INT,
+                   ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER)
+from static_server import ROOT
+
+# Build step for the 3D assets: converts assets/*.gltf into one binary GLB bundle holding every model,
+# with deduplicated geometry, materials and images, quantized vertex attributes (KHR_mesh_quantization)
+# and a content hashed file name; the scene page loads it once and picks each model's top level node by
+# name. The cube map faces are copied under hashed names. Writes static/assets/manifest.json for
+# assets.py and prints a size/time report, comparing with the source files and per model GLBs.
+#
+#   python build_assets.py
+
+SOURCE_DIR = os.path.join(ROOT, "assets")
+ENV_DIR = os.path.join(ROOT, "env")
+OUT_DIR = os.path.join(ROOT, "static", "assets")
+MANIFEST = os.path.join(OUT_DIR, "manifest.json")
+
+BYTE = 5120
+SHORT = 5122
+COMPONENTS = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT4": 16}
+DTYPES = {BYTE: np.int8, UNSIGNED_BYTE: np.uint8, SHORT: np.int16, UNSIGNED_SHORT: np.uint16, UNSIGNED_INT: np.uint32, FLOAT: np.float32}
+
+######################### reading #########################
+
+def asset_name(filename:str) -> str:
+    # "google .gltf" -> "google", "Cube.001.gltf" -> "cube.001"
+    return os.path.splitext(filename)[0].strip().lower()
+
+
+def hashed_name(name:str, data:bytes, extension:str) -> str:
+    return f"{name}.{hashlib.sha1(data).hexdigest()[:16]}{extension}"
+
+
+def load_gltf(path:str):
+    with open(path, encoding="utf-8") as f:
+        gltf = json.load(f)
+    buffers = []
+    for buffer in gltf.get("buffers", []):
+        uri = buffer["uri"]
+        if uri.startswith("data:"):
+            buffers.append(base64.b64decode(uri.split(",", 1)[1]))
+        else:
+            with open(os.path.join(os.path.dirname(path), uri), "rb") as f:
+                buffers.append(f.read())
+    return gltf, buffers
+
+
+def view_bytes(gltf:dict, buffers:list, index:int) -> bytes:
+    view = gltf["bufferViews"][index]
+    offset = view.get("byteOffset", 0)
+    return buffers[view["buffer"]][offset:offset + view["byteLength"]]
+
+
+def accessor_array(gltf:dict, buffers:list, index:int) -> np.ndarray:
+    accessor = gltf["accessors"][index]
+    dtype = np.dtype(DTYPES[accessor["componentType"]])
+    components = COMPONENTS[accessor["type"]]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    data = view_bytes(gltf, buffers, accessor["bufferView"])
+    stride = view.get("byteStride", dtype.itemsize * components)
+    offset = accessor.get("byteOffset", 0)
+    rows = np.ndarray((accessor["count"], components), dtype=dtype, buffer=data, offset=offset, strides=(stride, dtype.itemsize))
+    return rows.copy() if components > 1 else rows[:, 0].copy()
+
+######################### writing #########################
+
+class BundleWriter:
+    # glTF being assembled from several source files; identical accessors, images, samplers and
+    # materials are written once and shared by every mesh that uses them
+    def __init__(self):
+        self.gltf = {"asset": {"version": "2.0", "generator": "FinVerse build_assets.py"}, "scene": 0, "scenes": [{"nodes": []}],
+                     "nodes": [], "meshes": [], "materials": [], "textures": [], "images": [], "samplers": [],
+                     "extensionsUsed": ["KHR_mesh_quantization"], "extensionsRequired": ["KHR_mesh_quantization"]}
+        self.buffer = BufferBuilder(self.gltf)
+        self._seen = {}
+
+    def _once(self, kind:str, key, make) -> int:
+        key = (kind, key)
+        if key not in self._seen:
+            self._seen[key] = make()
+        return self._seen[key]
+
+    def _append(self, kind:str, item:dict) -> int:
+        self.gltf[kind].append(item)
+        return len(self.gltf[kind]) - 1
+
+    def add_accessor(self, array:np.ndarray, component_type:int, type:str, target:int, normalized:bool = False,
+                     bounds:bool = False, byte_stride:int = None) -> int:
+        key = (array.tobytes(), array.shape, component_type, type, normalized)
+        return self._once("accessor", key, lambda: self.buffer.add(array, component_type, type, target, normalized, bounds, byte_stride))
+
+    def add_material(self, gltf:dict, buffers:list, index:int) -> int:
+        material = json.loads(json.dumps(gltf["materials"][index]))
+        material.pop("name", None)
+        base_color = material.get("pbrMetallicRoughness", {}).get("baseColorTexture")
+        if base_color is not None:
+            base_color["index"] = self.add_texture(gltf, buffers, base_color["index"])
+        return self._once("material", json.dumps(material, sort_keys=True), lambda: self._append("materials", material))
+
+    def add_texture(self, gltf:dict, buffers:list, index:int) -> int:
+        texture = gltf["textures"][index]
+        image = gltf["images"][texture["source"]]
+        data = view_bytes(gltf, buffers, image["bufferView"])
+        source = self._once("image", data, lambda: self._append("images", {"bufferView": self.buffer.add_view(data), "mimeType": image["mimeType"]}))
+        sampler = gltf["samplers"][texture["sampler"]] if "sampler" in texture else {}
+        sampler = self._once("sampler", json.dumps(sampler, sort_keys=True), lambda: self._append("samplers", sampler))
+        return self._once("texture", (source, sampler), lambda: self._append("textures", {"source": source, "sampler": sampler}))
+
+    def add_mesh(self, gltf:dict, buffers:list, index:int):
+        # Quantize one mesh: positions to normalized int16 around the mesh center (the returned node
+        # transform scales them back), normals to normalized int8, texture coordinates in 0..1 to
+        # normalized uint16. Tangents are dropped, none of the materials use normal maps.
+        mesh = gltf["meshes"][index]
+        positions = [accessor_array(gltf, buffers, p["attributes"]["POSITION"]) for p in mesh["primitives"]]
+        low = np.min([p.min(axis=0) for p in positions], axis=0)
+        high = np.max([p.max(axis=0) for p in positions], axis=0)
+        center = (low + high) / 2
+        # one scale for all axes, so the dequantization transform does not distort the normals
+        extent = float(max((high - low).max() / 2, 1e-6))
+
+        primitives = []
+        for primitive, position in zip(mesh["primitives"], positions):
+            attributes = {}
+            quantized = np.round((position - center) / extent * 32767).astype(np.int16)
+            attributes["POSITION"] = self.add_accessor(np.pad(quantized, ((0, 0), (0, 1))), SHORT, "VEC3", ARRAY_BUFFER, True, True, 8)
+            bounds = self.gltf["accessors"][attributes["POSITION"]]
+            bounds["min"], bounds["max"] = quantized.min(axis=0).tolist(), quantized.max(axis=0).tolist()
+
+            if "NORMAL" in primitive["attributes"]:
+                normal = accessor_array(gltf, buffers, primitive["attributes"]["NORMAL"])
+                normal = np.round(np.clip(normal, -1, 1) * 127).astype(np.int8)
+                attributes["NORMAL"] = self.add_accessor(np.pad(normal, ((0, 0), (0, 1))), BYTE, "VEC3", ARRAY_BUFFER, True, byte_stride=4)
+
+            if "TEXCOORD_0" in primitive["attributes"]:
+                uv = accessor_array(gltf, buffers, primitive["attributes"]["TEXCOORD_0"])
+                if uv.min() >= 0 and uv.max() <= 1:
+                    attributes["TEXCOORD_0"] = self.add_accessor(np.round(uv * 65535).astype(np.uint16), UNSIGNED_SHORT, "VEC2", ARRAY_BUFFER, True)
+                else:
+                    attributes["TEXCOORD_0"] = self.add_accessor(uv.astype(np.float32), FLOAT, "VEC2", ARRAY_BUFFER)
+
+            out = {"attributes": attributes}
+            if "indices" in primitive:
+                indices = accessor_array(gltf, buffers, primitive["indices"])
+                small = indices.max() < 65536
+                out["indices"] = self.add_accessor(indices.astype(np.uint16 if small else np.uint32),
+                                                   UNSIGNED_SHORT if small else UNSIGNED_INT, "SCALAR", ELEMENT_ARRAY_BUFFER)
+            if "material" in primitive:
+                out["material"] = self.add_material(gltf, buffers, primitive["material"])
+            primitives.append(out)
+
+        key = json.dumps(primitives, sort_keys=True)
+        mesh_index = self._once("mesh", key, lambda: self._append("meshes", {"primitives": primitives}))
+        return mesh_index, {"translation": center.tolist(), "scale": [extent] * 3}
+
+    def add_model(self, name:str, gltf:dict, buffers:list) -> int:
+        # every node of the source keeps its transform, the mesh hangs below it on a dequantization node
+        def add_node(index):
+            node = gltf["nodes"][index]
+            out = {"name": node.get("name", name)}
+            for key in ("translation", "rotation", "scale", "matrix"):
+                if key in node:
+                    out[key] = node[key]
+            children = [add_node(child) for child in node.get("children", [])]
+            if "mesh" in node:
+                mesh, transform = self.add_mesh(gltf, buffers, node["mesh"])
+                children.append(self._append("nodes", {"mesh": mesh, **transform}))
+            if children:
+                out["children"] = children
+            return self._append("nodes", out)
+
+        scene = gltf["scenes"][gltf.get("scene", 0)]
+        # source nodes may carry the same name, the model name is also kept in extras (userData in three.js)
+        root = self._append("nodes", {"name": name, "extras": {"model": name}, "children": [add_node(node) for node in scene["nodes"]]})
+        self.gltf["scenes"][0]["nodes"].append(root)
+        return root
+
+    def finish(self) -> bytes:
+        for kind in ("materials", "textures", "images", "samplers", "meshes"):
+            if not self.gltf[kind]:
+                del self.gltf[kind]
+        return pack_glb(self.gltf, self.buffer.finish())
+
+######################### build #########################
+
+def write_hashed(name:str, data:bytes, extension:str) -> str:
+    filename = hashed_name(name, data, extension)
+    with open(os.path.join(OUT_DIR, filename), "wb") as f:
+        f.write(data)
+    return filename
+
+
+def build_env(report:dict) -> dict:
+    # Cube map faces keep their JPEG bytes under hashed names, for cube-background in js/bundle-model.js.
+    # No compressed (KTX2) cube map: A-Frame 1.2.0 ships three r125, whose KTX2Loader reads no cube maps.
+    faces = ["posx", "negx", "posy", "negy", "posz", "negz"]
+    paths = [os.path.join(ENV_DIR, f"{face}.jpg") for face in faces]
+    env = {}
+    for face, path in zip(faces, paths):
+        with open(path, "rb") as f:
+            env[face] = write_hashed(f"env-{face}", f.read(), ".jpg")
+    report["env_source_bytes"] = sum(os.path.getsize(path) for path in paths)
+    return env
+
+
+def build() -> dict:
+    start = time.perf_counter()
+    os.makedirs(OUT_DIR, exist_ok=True)
+    for filename in os.listdir(OUT_DIR):
+        if re.search(r"\.[0-9a-f]{16}\.", filename):
+            os.remove(os.path.join(OUT_DIR, filename))
+
+    sources = sorted(filename for filename in os.listdir(SOURCE_DIR) if filename.endswith(".gltf"))
+    manifest = {"models": {}}
+    report = {"models": {}}
+    bundle = BundleWriter()
+
+    for filename in sources:
+        path = os.path.join(SOURCE_DIR, filename)
+        name = asset_name(filename)
+        gltf, buffers = load_gltf(path)
+
+        # only measured: the size of this model shipped on its own
+        single = BundleWriter()
+        single.add_model(name, gltf, buffers)
+        report["models"][name] = {"source_bytes": os.path.getsize(path), "glb_bytes": len(single.finish())}
+
+        # model name -> name of its top level node in the bundle
+        manifest["models"][name] = name
+
+        bundle.add_model(name, gltf, buffers)
+
+    glb = bundle.finish()
+    manifest["bundle"] = write_hashed("bundle", glb, ".glb")
+    manifest["env"] = build_env(report)
+
+    report["source_bytes"] = sum(model["source_bytes"] for model in report["models"].values())
+    report["glb_bytes"] = sum(model["glb_bytes"] for model in report["models"].values())
+    report["bundle_bytes"] = len(glb)
+    report["source_requests"] = len(sources)
+    report["bundle_requests"] = 1
+    report["bundle_meshes"] = len(bundle.gltf.get("meshes", []))
+    report["bundle_accessors"] = len(bundle.gltf["accessors"])
+    report["build_seconds"] = round(time.perf_counter() - start, 3)
+
+    with open(MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    with open(os.path.join(OUT_DIR, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def print_report(report:dict) -> None:
+    print(f"{'model':<12} {'gltf':>10} {'glb':>10}")
+    for name, model in report["models"].items():
+        print(f"{name:<12} {model['source_bytes']:>10} {model['glb_bytes']:>10}")
+    print(f"{'total':<12} {report['source_bytes']:>10} {report['glb_bytes']:>10}")
+    print(f"bundle: {report['bundle_bytes']} bytes, {report['bundle_meshes']} meshes, {report['bundle_accessors']} accessors, "
+          f"1 request instead of {report['source_requests']} "
+          f"({report['source_bytes'] / report['bundle_bytes']:.1f}x fewer bytes)")
+    print(f"env: {report['env_source_bytes']} bytes of JPEG in 6 faces")
+    print(f"built in {report['build_seconds']}s")
+
+
+if __name__ == "__main__":
+    print_report(build())
+    sys.exit(0)
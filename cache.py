@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import datetime
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+######################### cache configuration #########################
+
+CACHE_DIR = os.environ.get("FINDATA_CACHE_DIR", ".findata")
+
+# live:   use the cache, fall back to the network on a miss
+# record: like live, but every network response is also written to the fixture directory
+# replay: never touch the network, serve everything from the fixture directory
+# The EodStore and ListingIndex in FINDATA_CACHE_DIR decide which requests are made at all (only missing date
+# ranges, only unresolved companies), so record and replay each with an empty FINDATA_CACHE_DIR, e.g.
+#   FINDATA_CACHE_MODE=record FINDATA_CACHE_DIR=$(mktemp -d) streamlit run app.py
+#   FINDATA_CACHE_MODE=replay FINDATA_CACHE_DIR=$(mktemp -d) streamlit run app.py
+CACHE_MODE = os.environ.get("FINDATA_CACHE_MODE", "live")
+FIXTURE_DIR = os.environ.get("FINDATA_FIXTURE_DIR", "fixtures")
+
+MINUTE = 60
+DAY = 24 * 60 * MINUTE
+
+# time to live in seconds per endpoint family (None = never expires)
+TTL_SEARCH = 7 * DAY
+TTL_REFERENCE = 7 * DAY
+TTL_ESG = 1 * DAY
+TTL_EOD_OPEN = 15 * MINUTE
+TTL_DEFAULT = 1 * DAY
+
+# Size bounds. The memory tier keeps at most MEMORY_BYTES of response bodies (and memory_entries entries).
+# The disk tier is swept every SWEEP_EVERY writes: rows expired for longer than STALE_KEEP are no use as a
+# stale fallback any more and are deleted, then the least recently used rows until the compressed bodies
+# fit DISK_BYTES. SQLite reuses the freed pages, so the file stops growing rather than shrinking.
+MEMORY_BYTES = int(os.environ.get("FINDATA_CACHE_MEMORY_MB", "32")) * 1024 * 1024
+DISK_BYTES = int(os.environ.get("FINDATA_CACHE_DISK_MB", "512")) * 1024 * 1024
+STALE_KEEP = 30 * DAY
+SWEEP_EVERY = 200
+
+
+def cache_key(end_point:str, query_string:dict) -> str:
+    # endpoint plus query string with the parameters in a stable order
+    return f"{end_point}?{urllib.parse.urlencode(sorted(query_string.items()))}"
+
+
+def ttl_for(end_point:str, query_string:dict):
+    if end_point.endswith("/searchInstruments"):
+        return TTL_SEARCH
+    if "/referenceData/" in end_point:
+        return TTL_REFERENCE
+    if "/esg/" in end_point or "/_regulatoryData/" in end_point:
+        return TTL_ESG
+    if end_point.endswith("/eodTimeseries"):
+        # a range that ended before today is final, anything touching today still moves
+        to_date = query_string.get("to", "")
+        if to_date and to_date < datetime.date.today().isoformat():
+            return None
+        return TTL_EOD_OPEN
+    return TTL_DEFAULT
+
+
+class CachedResponse:
+    # the subset of requests.Response that FinancialDataAPI relies on
+    def __init__(self, status_code:int, content:bytes):
+        self.status_code = status_code
+        self.content = content
+
+
+class FixtureMissing(Exception):
+    pass
+
+######################### ResponseCache #########################
+
+class ResponseCache:
+    def __init__(self, cache_dir:str = CACHE_DIR, mode:str = CACHE_MODE, fixture_dir:str = FIXTURE_DIR, memory_entries:int = 256,
+                 memory_bytes:int = MEMORY_BYTES, disk_bytes:int = DISK_BYTES):
+        self.mode = mode
+        self.fixture_dir = fixture_dir
+        self.memory_entries = memory_entries
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        self._db = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(cache_dir, "responses.sqlite3"), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, status INTEGER, body BLOB, expires REAL, used REAL)")
+            # caches written before the sweep have no last use, their rows are the first to go
+            if "used" not in [column[1] for column in self._db.execute("PRAGMA table_info(responses)")]:
+                self._db.execute("ALTER TABLE responses ADD COLUMN used REAL")
+            with self._lock:
+                self._sweep()
+
+    def get(self, key:str):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[2] is None or entry[2] > now:
+                    self._memory.move_to_end(key)
+                    return CachedResponse(entry[0], entry[1])
+
+            if self._db is not None:
+                row = self._db.execute("SELECT status, body, expires FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and (row[2] is None or row[2] > now):
+                    self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+                    content = zlib.decompress(row[1])
+                    self._remember(key, row[0], content, row[2])
+                    return CachedResponse(row[0], content)
+        return None
+
+    def get_stale(self, key:str):
+        # the last response stored for key even if it has expired, for when the upstream is unavailable
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                return CachedResponse(entry[0], entry[1])
+            if self._db is not None:
+                row = self._db.execute("SELECT status, body FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    return CachedResponse(row[0], zlib.decompress(row[1]))
+        return None
+
+    def put(self, key:str, response, ttl) -> None:
+        # only successful responses are worth keeping
+        if str(response.status_code)[0] != "2":
+            return
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        with self._lock:
+            self._remember(key, response.status_code, response.content, expires)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses (key, status, body, expires, used) VALUES (?, ?, ?, ?, ?)",
+                                 (key, response.status_code, zlib.compress(response.content), expires, now))
+                self._writes += 1
+                if self._writes % SWEEP_EVERY == 0:
+                    self._sweep()
+
+    def _remember(self, key, status_code, content, expires):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old[1])
+        # a body larger than the whole budget is only kept on disk
+        if len(content) > self.memory_bytes:
+            return
+        self._memory[key] = (status_code, content, expires)
+        self._memory_size += len(content)
+        while len(self._memory) > self.memory_entries or self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted[1])
+
+    def _sweep(self) -> None:
+        # called with the lock held: long expired rows first, then the least recently used over DISK_BYTES.
+        # Memory hits do not write to the disk tier, the responses held in memory count as just used.
+        try:
+            now = time.time()
+            self._db.executemany("UPDATE responses SET used = ? WHERE key = ?", [(now, key) for key in self._memory])
+            expired = self._db.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires < ?",
+                                       (now - STALE_KEEP,)).rowcount
+            over = self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM (SELECT key, SUM(length(body)) OVER "
+                "(ORDER BY used DESC, key) AS total FROM responses) WHERE total > ?)", (self.disk_bytes,)).rowcount
+            if expired or over:
+                logging.info(f"Response cache: removed {expired} long expired and {over} least recently used responses")
+        except sqlite3.Error as err:
+            logging.warning(f"Error - sweeping the response cache: {err}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    ######################### record / replay #########################
+
+    def _fixture_path(self, key:str) -> str:
+        return os.path.join(self.fixture_dir, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def load_fixture(self, key:str) -> CachedResponse:
+        path = self._fixture_path(key)
+        if not os.path.exists(path):
+            raise FixtureMissing(f"No fixture for {key} ({path})")
+        with open(path, encoding="utf-8") as f:
+            fixture = json.load(f)
+        return CachedResponse(fixture["status"], fixture["body"].encode())
+
+    def save_fixture(self, key:str, response) -> None:
+        os.makedirs(self.fixture_dir, exist_ok=True)
+        with open(self._fixture_path(key), "w", encoding="utf-8") as f:
+            json.dump({"key": key, "status": response.status_code, "body": response.content.decode()}, f)
+        logging.debug(f"Recorded fixture for {key}")
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import datetime
+import threading
+from cache import CACHE_DIR
+from parsing import EodBar, ListingSeries
+
+######################### helpers #########################
+
+def _day(date:str) -> datetime.date:
+    return datetime.date.fromisoformat(date)
+
+
+def _shift(date:str, days:int) -> str:
+    return (_day(date) + datetime.timedelta(days=days)).isoformat()
+
+
+def subtract_ranges(from_date:str, to_date:str, covered:list) -> list:
+    # parts of [from_date, to_date] (inclusive ISO dates) not inside any of the sorted covered ranges
+    missing = []
+    start = from_date
+    for covered_from, covered_to in covered:
+        if covered_to < start:
+            continue
+        if covered_from > to_date:
+            break
+        if covered_from > start:
+            missing.append((start, _shift(covered_from, -1)))
+        start = _shift(covered_to, 1)
+        if start > to_date:
+            return missing
+    missing.append((start, to_date))
+    return missing
+
+
+def merge_ranges(ranges:list) -> list:
+    # union of inclusive date ranges, adjacent ranges are joined
+    merged = []
+    for from_date, to_date in sorted(ranges):
+        if merged and from_date <= _shift(merged[-1][1], 1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], to_date))
+        else:
+            merged.append((from_date, to_date))
+    return merged
+
+######################### EodStore #########################
+
+class EodStore:
+    # EoD bars per listing plus the date ranges already fetched for it, kept in SQLite so the store
+    # survives restarts and is shared by every Streamlit worker using the same cache directory
+    def __init__(self, cache_dir:str = CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "eod.sqlite3"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS ranges (listing TEXT, from_date TEXT, to_date TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ranges_listing ON ranges (listing)")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS bars (listing TEXT, date TEXT, open REAL, high REAL, low REAL,
+                            close REAL, volume REAL, PRIMARY KEY (listing, date))""")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def covered(self, listing:str) -> list:
+        with self._lock:
+            return self._db.execute("SELECT from_date, to_date FROM ranges WHERE listing = ? ORDER BY from_date", (listing,)).fetchall()
+
+    def missing_ranges(self, listing:str, from_date:str, to_date:str) -> list:
+        return subtract_ranges(from_date, to_date, self.covered(listing))
+
+    def add(self, listing:str, from_date:str, to_date:str, series:ListingSeries) -> None:
+        # Store the bars and mark [from_date, to_date] as held. Today's bar is not final yet,
+        # so a range reaching today is only marked up to yesterday and today is fetched again next time.
+        today = datetime.date.today().isoformat()
+        to_date = min(to_date, _shift(today, -1))
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     [(listing, bar.date, bar.open, bar.high, bar.low, bar.close, bar.volume) for bar in series.bars if bar.date])
+                if from_date <= to_date:
+                    ranges = self._db.execute("SELECT from_date, to_date FROM ranges WHERE listing = ?", (listing,)).fetchall()
+                    self._db.execute("DELETE FROM ranges WHERE listing = ?", (listing,))
+                    self._db.executemany("INSERT INTO ranges VALUES (?, ?, ?)",
+                                         [(listing, f, t) for f, t in merge_ranges(ranges + [(from_date, to_date)])])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def load(self, listing:str, from_date:str, to_date:str) -> ListingSeries:
+        with self._lock:
+            rows = self._db.execute("""SELECT date, open, high, low, close, volume FROM bars
+                                       WHERE listing = ? AND date >= ? AND date <= ? ORDER BY date""", (listing, from_date, to_date)).fetchall()
+        return ListingSeries(listing, [EodBar(*row) for row in rows])
+
+    def fetch(self, api, scheme:str, listings:list, from_date:str, to_date:str = '') -> dict:
+        # {listing id: ListingSeries} for [from_date, to_date], requesting only the sub-ranges not held yet.
+        # Listings missing the same sub-range share one batched request. As with listing_EoDTimeseries_batched,
+        # listings a sub-range could not be fetched for are left out, so callers can tell failures from no data.
+        to_date = to_date or datetime.date.today().isoformat()
+        gaps = {}
+        for listing in listings:
+            missing = self.missing_ranges(listing, from_date, to_date)
+            api.metrics.record_local("eod_store", len(missing) == 0)
+            for gap in missing:
+                gaps.setdefault(gap, []).append(listing)
+
+        failed = set()
+        for (gap_from, gap_to), ids in gaps.items():
+            fetched = api.listing_EoDTimeseries_batched(scheme, ids, gap_from, gap_to)
+            for listing in ids:
+                # listings without an answer (failed request) are not marked, so they are asked for again
+                if listing in fetched:
+                    self.add(listing, gap_from, gap_to, fetched[listing])
+                else:
+                    failed.add(listing)
+
+        return {listing: self.load(listing, from_date, to_date) for listing in listings if listing not in failed}
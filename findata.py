@@ -0,0 +1,501 @@
+import os
+import json
+import time
+import urllib
+import logging
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import requests
+from requests.adapters import HTTPAdapter
+from cache import ResponseCache, cache_key, ttl_for
+from parsing import ListingSeries, parse_search, parse_eod
+from resolver import MAX_CANDIDATES
+from metrics import METRICS, Metrics
+from resilience import (MAX_RETRIES, RETRY_STATUSES, TokenBucket, CircuitBreaker, CircuitOpen, SingleFlight,
+                        backoff_delay, gives_up, retry_after_seconds)
+
+######################### API configuration #########################
+
+FINDATA_URL = os.environ.get("FINDATA_URL", "https://web.api.six-group.com/api/findata")
+CERTIFICATE_PATH = os.environ.get("FINDATA_CERT_DIR", "ch52991-hackathon1")
+
+# number of requests in flight at once, also the size of the connection pool
+MAX_WORKERS = int(os.environ.get("FINDATA_MAX_WORKERS", "8"))
+# (connect, read) timeout in seconds for every upstream request
+REQUEST_TIMEOUT = (5, 30)
+
+# limits for packing several ids into one request
+MAX_BATCH_IDS = int(os.environ.get("FINDATA_MAX_BATCH_IDS", "50"))
+MAX_URL_LENGTH = 2000
+# seconds a company ready for its EoD request waits for others to share the request with
+BATCH_WINDOW = float(os.environ.get("FINDATA_BATCH_WINDOW", "0.02"))
+
+class FinancialDataAPI:
+    def __init__(self, cache:ResponseCache = None, url:str = FINDATA_URL, certificate_path:str = CERTIFICATE_PATH,
+                 max_workers:int = MAX_WORKERS, timeout = REQUEST_TIMEOUT, metrics:Metrics = METRICS,
+                 limiter:TokenBucket = None, breaker:CircuitBreaker = None, max_retries:int = MAX_RETRIES):
+        self.url = url
+        self.metrics = metrics
+        self.max_workers = max_workers
+        self.timeout = timeout
+        # request policy, shared by every session using this instance (see resilience.py)
+        self.limiter = limiter if limiter is not None else TokenBucket()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.max_retries = max_retries
+        self.inflight = SingleFlight()
+        
+        self.headers = {
+            "content-type": "application/json",
+            "accept": "application/json",
+            "api-version": "2022-06-01"
+        }
+        # one keep-alive connection per worker, so the mTLS handshake happens once per pool slot.
+        # Sessions and nested map_concurrent calls each bring their own threads, so the number of requests
+        # on the wire is capped here at the pool size, otherwise urllib3 opens and discards extra connections.
+        self.connections = threading.BoundedSemaphore(max_workers)
+        self.session = requests.session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if certificate_path:
+            self.session.cert = (f'{certificate_path}/signed-certificate.pem', f'{certificate_path}/private-key.pem')
+        self.cache = cache if cache is not None else ResponseCache()
+    
+    def close(self) -> None:
+        self.session.close()
+        self.cache.close()
+
+    def http_request(self, end_point:str, query_string:dict) -> str:
+        # Serve from the cache (or the fixture directory in replay mode) before going to the network
+        key = cache_key(end_point, query_string)
+        if self.cache.mode == "replay":
+            self.metrics.record_cache(end_point, True)
+            return self.cache.load_fixture(key)
+
+        cached = self.cache.get(key)
+        self.metrics.record_cache(end_point, cached is not None)
+        if cached is not None:
+            # a recording must hold every response the run used, also those a warm cache answered
+            if self.cache.mode == "record":
+                self.cache.save_fixture(key, cached)
+            return cached
+
+        # identical requests from concurrent sessions share one upstream call
+        return self.inflight.do(key, lambda: self._fetch(end_point, query_string, key))
+
+    def _fetch(self, end_point:str, query_string:dict, key:str):
+        # Go to the network through the circuit breaker and the rate limiter, retrying 429/5xx and connection
+        # errors with backoff, but not when Retry-After asks for longer than the backoff cap. When the upstream
+        # stays unavailable the last cached response is served even if it has expired, otherwise the failed
+        # response is returned (or the error raised) as before.
+        if not self.breaker.allow():
+            return self._serve_stale(end_point, key, CircuitOpen(f"Upstream unavailable, not requesting {end_point}"))
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                if self.breaker.state == "open":
+                    break
+                self.metrics.record_retry(end_point)
+                time.sleep(backoff_delay(attempt - 1, retry_after))
+
+            self.limiter.acquire()
+            try:
+                r = self._http_request(end_point, query_string)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                failure, retry_after = err, None
+                continue
+            except Exception:
+                self.breaker.record_failure()
+                raise
+
+            if r.status_code not in RETRY_STATUSES:
+                self.breaker.record_success()
+                self.limiter.relax()
+                self.cache.put(key, r, ttl_for(end_point, query_string))
+                if self.cache.mode == "record":
+                    self.cache.save_fixture(key, r)
+                return r
+
+            if r.status_code == 429:
+                self.limiter.throttle()
+            failure, retry_after = r, retry_after_seconds(r.headers.get("Retry-After"))
+            if gives_up(retry_after):
+                logging.info(f"Upstream asks to retry {end_point} in {retry_after:.0f}s, not retrying")
+                break
+
+        self.breaker.record_failure()
+        return self._serve_stale(end_point, key, failure)
+
+    def _serve_stale(self, end_point:str, key:str, failure):
+        stale = self.cache.get_stale(key)
+        if stale is not None:
+            self.metrics.record_stale(end_point)
+            logging.info(f"Serving stale {key}: {failure}")
+            return stale
+        if isinstance(failure, Exception):
+            raise failure
+        return failure
+
+    def _http_request(self, end_point:str, query_string:dict) -> str:
+        # Make an HTTP request and send the raw response
+        start = time.perf_counter()
+        try:
+            http_request = f"{self.url}{end_point}?{urllib.parse.urlencode(query_string)}"
+            
+            with self.connections:
+                start = time.perf_counter()
+                r = self.session.get(http_request, headers=self.headers, timeout=self.timeout) #, verify='./six-certificate/certificate.pem')
+            self.metrics.observe_request(end_point, time.perf_counter() - start, r.status_code, len(r.content))
+
+            # only pay for pretty printing the payload when someone reads it
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                if str(r.status_code)[0] != "2":
+                    logging.debug(f"HTTP{r.status_code}: {r.content}")
+                else:
+                    logging.debug(f"HTTP{r.status_code}: {json.dumps(json.loads(r.content), indent=2)}")
+                
+            return r
+        except requests.exceptions.SSLError as err:
+            self.metrics.observe_request(end_point, time.perf_counter() - start, "error", 0)
+            logging.error(f"Error - {http_request}:\r\n{err}")
+            raise(Exception(str(err)))
+        except requests.exceptions.RequestException:
+            self.metrics.observe_request(end_point, time.perf_counter() - start, "error", 0)
+            raise
+
+    def map_concurrent(self, func, items:list, max_workers:int = None) -> list:
+        # Run func(item) for all items on a bounded thread pool and return the results in the order of items.
+        # A failed item gets its exception in place of the result instead of failing the whole batch.
+        results = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            futures = {executor.submit(func, item): i for i, item in enumerate(items)}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as err:
+                    results[futures[future]] = err
+        return results
+
+    def http_request_with_scheme_id(self, end_point:str, scheme:str, ids:list) -> str:
+        query_string = query_string = { 
+            'scheme': scheme,
+            'ids': ",".join(ids)
+        }
+        return self.http_request(end_point, query_string)        
+            
+    def _convert_response_to_object(self, http_response):
+        if str(http_response.status_code)[0] == "2":
+            obj = json.loads(http_response.content, object_hook=lambda d: SimpleNamespace(**d))
+            return obj
+        return None
+            
+    def text_search(self, query:str) -> object:
+        end_point = "/v1/searchInstruments"
+        #end_point = "/search/v1/"
+        query_string = { 'query': query }
+        resp = self.http_request(end_point, query_string)
+        
+        return self._convert_response_to_object(resp)
+    
+    def instrument_summary(self, scheme:str, instruments: list):
+        end_point = "/v1/instruments/referenceData/instrumentSummary"
+        #end_point = "/v1/summary/instruments"
+        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
+        return self._convert_response_to_object(resp)
+
+    def instrument_symbology(self, scheme:str, instruments: list):
+        end_point = "/v1/instruments/referenceData/instrumentSymbology"
+        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
+        return self._convert_response_to_object(resp)
+
+    def instrument_BASELIII_HQLA_EU(self, scheme:str, instruments: list):
+        end_point = "/v1/instruments/_regulatoryData/baseliiihqlaEU"
+        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
+        return self._convert_response_to_object(resp)
+
+    def instrument_BASELIII_HQLA_CH(self, scheme:str, instruments: list):
+        end_point = "/v1/instruments/_regulatoryData/baseliiihqlaCH"
+        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
+        return self._convert_response_to_object(resp)
+
+    def instrument_SFDR(self, scheme:str, instruments: list):
+        end_point = "/v1/instruments/esg/SFDRInvestee"
+        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
+        return self._convert_response_to_object(resp)
+
+    def instrument_TAXONOMY(self, scheme:str, instruments: list):
+        end_point = "/v1/instruments/esg/EUTaxonomyInvestee"
+        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
+        return self._convert_response_to_object(resp)
+
+    def instrument_EUESGMANUFACTURER(self, scheme:str, instruments: list):
+        end_point = "/v1/instruments/esg/EUESGManufacturer"
+        resp = self.http_request_with_scheme_id(end_point, scheme, instruments)
+        return self._convert_response_to_object(resp)
+    
+    def institution_summary(self, scheme:str, institutions: list):
+        end_point = "/v1/institutions/referenceData/institutionSummary"
+        resp = self.http_request_with_scheme_id(end_point, scheme, institutions)
+        return self._convert_response_to_object(resp)
+
+    def institution_symbology(self, scheme:str, institutions: list):
+        end_point = "/v1/institutions/referenceData/institutionSymbology"
+        resp = self.http_request_with_scheme_id(end_point, scheme, institutions)
+        return self._convert_response_to_object(resp)
+    
+    def institution_SFDR(self, scheme:str, institutions: list):
+        end_point = "/v1/institutions/esg/SFDRInvestee"
+        resp = self.http_request_with_scheme_id(end_point, scheme, institutions)
+        return self._convert_response_to_object(resp)
+
+    def institution_TAXONOMY(self, scheme:str, institutions: list):
+        end_point = "/v1/institutions/esg/EUTaxonomyInvestee"
+        resp = self.http_request_with_scheme_id(end_point, scheme, institutions)
+        return self._convert_response_to_object(resp)
+
+    def market_summary(self, scheme:str, markets: list):
+        end_point = "/v1/markets/referenceData/marketSummary"
+        resp = self.http_request_with_scheme_id(end_point, scheme, markets)
+        return self._convert_response_to_object(resp)
+    
+    def market_symboloy(self, scheme:str, markets: list):
+        end_point = "/v1/markets/referenceData/marketSymbology"
+        resp = self.http_request_with_scheme_id(end_point, scheme, markets)
+        return self._convert_response_to_object(resp)
+
+    def listing_EoDTimeseries(self, scheme:str, listings: list, from_date:str, to_date:str = ''):
+        end_point = "/v1/listings/marketData/eodTimeseries"
+        query_string = query_string = { 
+            'scheme': scheme,
+            'ids': ",".join(listings),
+            'from': from_date,
+            'to': to_date
+        }
+        resp = self.http_request(end_point, query_string)    
+        return self._convert_response_to_object(resp)
+
+    ######################### typed records #########################
+    # Same requests as above, decoded in one pass into parsing.py records instead of SimpleNamespace trees
+
+    def text_search_listings(self, query:str) -> tuple:
+        resp = self.http_request("/v1/searchInstruments", { 'query': query })
+        if str(resp.status_code)[0] != "2":
+            raise Exception(f"Search failed for {query}, upstream unavailable (HTTP{resp.status_code})")
+        return parse_search(resp.content)
+
+    def listing_EoDTimeseries_series(self, scheme:str, listings: list, from_date:str, to_date:str = '') -> dict:
+        end_point = "/v1/listings/marketData/eodTimeseries"
+        query_string = { 
+            'scheme': scheme,
+            'ids': ",".join(listings),
+            'from': from_date,
+            'to': to_date
+        }
+        resp = self.http_request(end_point, query_string)
+        if str(resp.status_code)[0] != "2":
+            raise Exception(f"HTTP{resp.status_code} for {len(listings)} listings")
+        # ids the response has no entry for were answered with nothing, not failed
+        series = {id: ListingSeries(id) for id in listings}
+        series.update(parse_eod(resp.content))
+        return series
+
+    def listing_EoDTimeseries_batched(self, scheme:str, listings: list, from_date:str, to_date:str = '',
+                                      max_ids:int = MAX_BATCH_IDS, max_url_length:int = MAX_URL_LENGTH) -> dict:
+        # Fetch the EoD timeseries of many listings in as few requests as the limits allow
+        # and split the combined responses back out into {listing id: ListingSeries}.
+        # Listings of failed requests are left out, an empty series means the upstream has no data.
+        end_point = "/v1/listings/marketData/eodTimeseries"
+        base_query = { 'scheme': scheme, 'ids': '', 'from': from_date, 'to': to_date }
+        base_length = len(f"{self.url}{end_point}?{urllib.parse.urlencode(base_query)}")
+        chunks = chunk_ids(listings, max_ids, max_url_length - base_length)
+
+        by_id = {}
+        for series in self.map_concurrent(lambda chunk: self.listing_EoDTimeseries_series(scheme, chunk, from_date, to_date), chunks):
+            if isinstance(series, Exception):
+                logging.warning(f"Error - EoD batch: {series}")
+                continue
+            by_id.update(series)
+        return by_id
+
+
+def chunk_ids(ids:list, max_ids:int, max_length:int) -> list:
+    # Greedily pack ids into chunks of at most max_ids whose url encoded, comma joined length stays below max_length
+    chunks = []
+    chunk = []
+    length = 0
+    for id in ids:
+        id_length = len(urllib.parse.quote_plus(id)) + (len(urllib.parse.quote_plus(",")) if chunk else 0)
+        if chunk and (len(chunk) >= max_ids or length + id_length > max_length):
+            chunks.append(chunk)
+            chunk = []
+            length = 0
+            id_length = len(urllib.parse.quote_plus(id))
+        chunk.append(id)
+        length += id_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+######################### print_object_attributes #########################
+
+def print_object_attributes_text(valors, bcs, obj:object, tab_level:int=0, min_attr_length:int=30):
+    if obj is None: return
+    space_sep = "  "
+    space = space_sep*tab_level
+    
+    if type(obj) == list:
+        for o in obj:
+            if type(o) == object or type(o) == SimpleNamespace:
+                print_object_attributes_text(valors, bcs, o, tab_level+1, min_attr_length)
+    else:
+        for attr, value in obj.__dict__.items():
+            if type(value) == object or type(value) == SimpleNamespace or type(value) == list:
+                # st.markdown(f"{space}{attr}")
+
+                adjusted_min_attr_length = min_attr_length - (len(space_sep)*(tab_level+1))
+                if adjusted_min_attr_length < 0: adjusted_min_attr_length = 0
+                print_object_attributes_text(valors, bcs, value, tab_level+1, adjusted_min_attr_length)
+            else:
+                if attr == "valor":
+                    valors.append(value)
+                if attr == "bc":
+                    bcs.append(value)
+                # st.markdown(f"{space}{attr:<{min_attr_length}}: {value}")    
+
+    # if length of valors and bcs is greater than 0, return them
+    if len(valors) > 0 and len(bcs) > 0:
+        return valors, bcs 
+
+######################### print_object_attributes (time series) ######################### 
+
+def print_object_attributes_timeseries(highs, lows, obj:object, tab_level:int=0, min_attr_length:int=30):
+    if obj is None: return
+    space_sep = "  "
+    space = space_sep*tab_level
+    
+    if type(obj) == list:
+        for o in obj:
+            if type(o) == object or type(o) == SimpleNamespace:
+                print_object_attributes_timeseries(highs, lows, o, tab_level+1, min_attr_length)
+                # print()
+            # else:
+            #     print(f"{space}{o:<{min_attr_length}}")
+    else:
+        for attr, value in obj.__dict__.items():
+            if type(value) == object or type(value) == SimpleNamespace or type(value) == list:
+                # print(f"{space}{attr}")
+
+                adjusted_min_attr_length = min_attr_length - (len(space_sep)*(tab_level+1))
+                if adjusted_min_attr_length < 0: adjusted_min_attr_length = 0
+                print_object_attributes_timeseries(highs, lows, value, tab_level+1, adjusted_min_attr_length)
+            else:
+                if attr == "high":
+                    highs.append(value)
+                if attr == "low":
+                    lows.append(value) 
+    
+    # if length of dates and volumes is greater than 0, return them
+    return highs, lows
+
+######################### company lookup #########################
+
+def company_candidates(api:FinancialDataAPI, company:str, index = None, start_date:str = '', end_date:str = '') -> list:
+    # VALOR_BC ids to try for company, from the resolver.ListingIndex if there is one, else from a text search
+    if index is not None:
+        listings = index.resolve(api, company, start_date, end_date)
+    else:
+        valors, bcs = api.text_search_listings(company)
+        listings = [f"{valor}_{bc}" for valor, bc in zip(valors, bcs)][:MAX_CANDIDATES]
+    if len(listings) == 0:
+        if index is not None and len(index.candidates(company)) > 0:
+            # every listing is known to be empty over this window
+            raise Exception(f"No EoD timeseries found for {company}")
+        raise Exception(f"No listing found for {company}")
+    return listings
+
+
+def _fetch_listings(api:FinancialDataAPI, listing_ids:list, start_date:str, end_date:str, store = None) -> dict:
+    if store is not None:
+        return store.fetch(api, "VALOR_BC", listing_ids, start_date, end_date)
+    return api.listing_EoDTimeseries_batched("VALOR_BC", listing_ids, start_date, end_date)
+
+
+def iter_companies_series(api:FinancialDataAPI, companies:list, start_date:str, end_date:str, store = None, index = None,
+                          batch_window:float = BATCH_WINDOW):
+    # Resolve every company to its search candidates and fetch their EoD timeseries, yielding
+    # (position in companies, company, ListingSeries or exception) as soon as a company is settled.
+    # There is no barrier between the steps: a company's first EoD request starts as soon as its own candidates
+    # are known. Companies ready within batch_window of each other (or while nothing else is in flight, at once)
+    # share one batched request, and a company whose candidate had no data joins the next batch with its next one.
+    # So the fastest company shows after its own search plus at most batch_window plus one EoD request, at the cost
+    # of a few more EoD requests than strict rounds would need when the searches finish far apart.
+    # With an eodstore.EodStore only the date ranges it does not hold yet are requested, with a
+    # resolver.ListingIndex companies resolved before are looked up locally and the outcome is recorded.
+    candidates = {}
+    tried = {}
+    ready = []
+    ready_since = 0.0
+    executor = ThreadPoolExecutor(max_workers=api.max_workers)
+    try:
+        pending = {executor.submit(company_candidates, api, company, index, start_date, end_date): ("search", i)
+                   for i, company in enumerate(companies)}
+        while pending or ready:
+            if ready and (not pending or len(ready) >= MAX_BATCH_IDS or time.monotonic() - ready_since >= batch_window):
+                batch = {i: candidates[i][tried[i]] for i in ready}
+                ready = []
+                future = executor.submit(_fetch_listings, api, list(dict.fromkeys(batch.values())), start_date, end_date, store)
+                pending[future] = ("eod", batch)
+                continue
+
+            timeout = max(0.0, ready_since + batch_window - time.monotonic()) if ready else None
+            finished, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in finished:
+                kind, what = pending.pop(future)
+                if kind == "search":
+                    try:
+                        candidates[what], tried[what] = future.result(), 0
+                    except Exception as err:
+                        yield what, companies[what], err
+                        continue
+                    next_candidate = [what]
+                else:
+                    try:
+                        listings = future.result()
+                    except Exception as err:
+                        logging.warning(f"Error - EoD batch: {err}")
+                        listings = {}
+                    next_candidate = []
+                    for i, id in what.items():
+                        series = listings.get(id)
+                        if series is None:
+                            # the request failed: says nothing about the listing, so it is not marked and the company
+                            # is reported as failed rather than as having no data
+                            yield i, companies[i], Exception(f"EoD request failed for {companies[i]}, upstream unavailable")
+                            continue
+                        if index is not None:
+                            index.mark(companies[i], id, len(series.bars) > 0, start_date, end_date)
+                        if len(series.bars) > 0:
+                            yield i, companies[i], series
+                            continue
+                        tried[i] += 1
+                        if tried[i] >= len(candidates[i]):
+                            yield i, companies[i], Exception(f"No EoD timeseries found for {companies[i]}")
+                        else:
+                            next_candidate.append(i)
+
+                if next_candidate:
+                    if not ready:
+                        ready_since = time.monotonic()
+                    ready += next_candidate
+    finally:
+        # the caller may stop early (a Streamlit rerun), requests still running are left to finish on their own
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def companies_series(api:FinancialDataAPI, companies:list, start_date:str, end_date:str, store = None, index = None) -> list:
+    # iter_companies_series collected: the ListingSeries or the exception per company, in the order of companies
+    results = [None] * len(companies)
+    for i, company, result in iter_companies_series(api, companies, start_date, end_date, store, index):
+        results[i] = result
+    return results
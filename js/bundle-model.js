@@ -0,0 +1,42 @@
+// Models and environment built by build_assets.py
+
+// One request for every logo: the bundle GLB is loaded once per page and each entity shows a clone
+// of the bundle's top level node for the given model (extras.model, userData once loaded).
+AFRAME.registerComponent('bundle-model', {
+  schema: {
+    src: { type: 'string' },
+    node: { type: 'string' }
+  },
+  init: function () {
+    var el = this.el;
+    var data = this.data;
+    var bundles = AFRAME.bundles = AFRAME.bundles || {};
+    if (!bundles[data.src]) {
+      bundles[data.src] = new Promise(function (resolve, reject) {
+        new THREE.GLTFLoader().load(data.src, resolve, undefined, reject);
+      });
+    }
+    bundles[data.src].then(function (gltf) {
+      var node = gltf.scene.children.find(function (child) { return child.userData.model === data.node; });
+      if (node) {
+        el.setObject3D('mesh', node.clone());
+        el.emit('model-loaded', { format: 'gltf', model: node });
+      } else {
+        console.warn('bundle-model: no node ' + data.node + ' in ' + data.src);
+      }
+    }, function (error) {
+      el.emit('model-error', { format: 'gltf', src: data.src });
+      console.error(error);
+    });
+  }
+});
+
+// Scene background from the six cube map faces, in the order posx, negx, posy, negy, posz, negz.
+AFRAME.registerComponent('cube-background', {
+  schema: { type: 'array' },
+  init: function () {
+    if (this.data.length === 6) {
+      this.el.object3D.background = new THREE.CubeTextureLoader().load(this.data);
+    }
+  }
+});
@@ -0,0 +1,122 @@
+import threading
+from collections import defaultdict
+
+# Per endpoint request metrics of FinancialDataAPI: latency histogram, bytes, status codes,
+# cache hits/misses, retries and stale responses, plus hits/misses of the local stores answering
+# before the response cache is asked (EodStore, ListingIndex). METRICS is the process wide registry every API instance
+# reports to unless it gets its own, rendered for Prometheus at /metrics by static_server.py.
+
+# upper bounds of the latency histogram buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency_buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.latency_sum = defaultdict(float)
+        self.requests = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.statuses = defaultdict(int)
+        self.cache = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.stale = defaultdict(int)
+        self.local = defaultdict(int)
+
+    def observe_request(self, end_point:str, seconds:float, status, size:int) -> None:
+        with self._lock:
+            buckets = self.latency_buckets[end_point]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self.latency_sum[end_point] += seconds
+            self.requests[end_point] += 1
+            self.bytes[end_point] += size
+            self.statuses[(end_point, str(status))] += 1
+
+    def record_cache(self, end_point:str, hit:bool) -> None:
+        with self._lock:
+            self.cache[(end_point, "hit" if hit else "miss")] += 1
+
+    def record_retry(self, end_point:str) -> None:
+        with self._lock:
+            self.retries[end_point] += 1
+
+    def record_stale(self, end_point:str) -> None:
+        # an expired cache entry served because the upstream was unavailable
+        with self._lock:
+            self.stale[end_point] += 1
+
+    def record_local(self, store:str, hit:bool) -> None:
+        # a lookup a local store answered by itself (hit) or had to go to the API for (miss)
+        with self._lock:
+            self.local[(store, "hit" if hit else "miss")] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            for counter in (self.latency_buckets, self.latency_sum, self.requests, self.bytes, self.statuses, self.cache, self.retries, self.stale, self.local):
+                counter.clear()
+
+    def quantile(self, end_point:str, q:float) -> float:
+        # upper bound of the histogram bucket holding the q quantile
+        with self._lock:
+            buckets = list(self.latency_buckets.get(end_point, []))
+            count = self.requests.get(end_point, 0)
+        for bound, cumulative in zip(BUCKETS, buckets):
+            if cumulative >= q * count:
+                return bound
+        return float("nan")
+
+    def summary(self) -> list:
+        # one row per endpoint, for the debug panel
+        with self._lock:
+            end_points = sorted(set(self.requests) | {e for e, _ in self.cache} | set(self.retries) | set(self.stale))
+        rows = []
+        for end_point in end_points:
+            requests = self.requests.get(end_point, 0)
+            rows.append({
+                "endpoint": end_point,
+                "requests": requests,
+                "mean ms": round(1000 * self.latency_sum.get(end_point, 0) / requests, 1) if requests else None,
+                "p95 ms <=": 1000 * self.quantile(end_point, 0.95) if requests else None,
+                "KB": round(self.bytes.get(end_point, 0) / 1000, 1),
+                "statuses": ", ".join(f"{status}: {n}" for (e, status), n in sorted(self.statuses.items()) if e == end_point),
+                "cache hits": self.cache.get((end_point, "hit"), 0),
+                "cache misses": self.cache.get((end_point, "miss"), 0),
+                "retries": self.retries.get(end_point, 0),
+                "stale": self.stale.get(end_point, 0),
+            })
+        return rows
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            lines += ["# HELP findata_request_seconds Upstream request latency.", "# TYPE findata_request_seconds histogram"]
+            for end_point, buckets in sorted(self.latency_buckets.items()):
+                for bound, cumulative in zip(BUCKETS, buckets):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'findata_request_seconds_bucket{{endpoint="{end_point}",le="{le}"}} {cumulative}')
+                lines.append(f'findata_request_seconds_sum{{endpoint="{end_point}"}} {self.latency_sum[end_point]}')
+                lines.append(f'findata_request_seconds_count{{endpoint="{end_point}"}} {self.requests[end_point]}')
+
+            lines += ["# HELP findata_response_bytes_total Bytes received from upstream.", "# TYPE findata_response_bytes_total counter"]
+            lines += [f'findata_response_bytes_total{{endpoint="{e}"}} {n}' for e, n in sorted(self.bytes.items())]
+
+            lines += ["# HELP findata_responses_total Upstream responses by status.", "# TYPE findata_responses_total counter"]
+            lines += [f'findata_responses_total{{endpoint="{e}",status="{s}"}} {n}' for (e, s), n in sorted(self.statuses.items())]
+
+            lines += ["# HELP findata_cache_total Response cache lookups.", "# TYPE findata_cache_total counter"]
+            lines += [f'findata_cache_total{{endpoint="{e}",result="{r}"}} {n}' for (e, r), n in sorted(self.cache.items())]
+
+            lines += ["# HELP findata_retries_total Retried requests.", "# TYPE findata_retries_total counter"]
+            lines += [f'findata_retries_total{{endpoint="{e}"}} {n}' for e, n in sorted(self.retries.items())]
+
+            lines += ["# HELP findata_stale_total Expired cache entries served while upstream was unavailable.", "# TYPE findata_stale_total counter"]
+            lines += [f'findata_stale_total{{endpoint="{e}"}} {n}' for e, n in sorted(self.stale.items())]
+
+            lines += ["# HELP findata_local_total Lookups of the local EoD store and listing index.", "# TYPE findata_local_total counter"]
+            lines += [f'findata_local_total{{store="{st}",result="{r}"}} {n}' for (st, r), n in sorted(self.local.items())]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
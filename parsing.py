@@ -0,0 +1,133 @@
+import json
+from dataclasses import dataclass, field
+
+# orjson is optional, it only makes decoding faster
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+######################### records #########################
+
+@dataclass(slots=True)
+class EodBar:
+    date: str
+    open: float = None
+    high: float = None
+    low: float = None
+    close: float = None
+    volume: float = None
+
+
+@dataclass(slots=True)
+class ListingSeries:
+    id: str
+    bars: list = field(default_factory=list)
+
+    @property
+    def highs(self) -> list:
+        return [bar.high for bar in self.bars if bar.high is not None]
+
+    @property
+    def lows(self) -> list:
+        return [bar.low for bar in self.bars if bar.low is not None]
+
+######################### decoders #########################
+
+def _walk(node):
+    # depth-first over the decoded JSON in document order, yielding every dict
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if type(node) is dict:
+            yield node
+            stack.extend(reversed([v for v in node.values() if type(v) is dict or type(v) is list]))
+        elif type(node) is list:
+            stack.extend(reversed([v for v in node if type(v) is dict or type(v) is list]))
+
+
+def _valors_bcs(tree):
+    # valor and bc values in the order print_object_attributes_text appends them: the keys of an object
+    # in document order, descending into a nested object or list where it appears
+    valors = []
+    bcs = []
+    stack = [iter(tree.items() if type(tree) is dict else enumerate(tree))]
+    while stack:
+        for key, value in stack[-1]:
+            if type(value) is dict:
+                stack.append(iter(value.items()))
+                break
+            if type(value) is list:
+                stack.append(enumerate(value))
+                break
+            if key == "valor":
+                valors.append(value)
+            elif key == "bc":
+                bcs.append(value)
+        else:
+            stack.pop()
+    return valors, bcs
+
+
+def parse_search(content:bytes):
+    # valor and bc of every search hit, in the same order as print_object_attributes_text
+    return _valors_bcs(_loads(content))
+
+
+def parse_listings_by_id(content:bytes) -> dict:
+    # {requested id: ["valor_bc", ...]} for reference data responses that answer several ids at once,
+    # from every object carrying both a valor and a bc (the listings of the instrument)
+    found = {}
+    for entry in ((_loads(content).get("data") or {}).get("instruments") or []):
+        if isinstance(entry, dict) and "requestedId" in entry:
+            listings = [f"{node['valor']}_{node['bc']}" for node in _walk(entry) if "valor" in node and "bc" in node]
+            found[entry["requestedId"]] = list(dict.fromkeys(listings))
+    return found
+
+
+def _bar(obj:dict) -> EodBar:
+    return EodBar(obj.get("sessionDate"), obj.get("open"), obj.get("high"), obj.get("low"), obj.get("close"), obj.get("volume"))
+
+
+def _eod_bar(obj:dict):
+    # object_hook: every bar becomes an EodBar while it is decoded, so its dict (and the fields that are
+    # not kept) is freed right away instead of the whole response being held as dicts first
+    return _bar(obj) if "sessionDate" in obj else obj
+
+
+def parse_eod(content:bytes) -> dict:
+    # {requested id: ListingSeries} for an eodTimeseries response:
+    # { "data": { "listings": [ { "requestedId": ..., "marketData": { "eodTimeseries": [ {...}, ... ] } } ] } }
+    # Decoded with json rather than orjson, which has no object hook.
+    listings = {}
+    for listing in ((json.loads(content, object_hook=_eod_bar).get("data") or {}).get("listings") or []):
+        bars = (listing.get("marketData") or {}).get("eodTimeseries") or []
+        series = ListingSeries(listing.get("requestedId"), [bar if type(bar) is EodBar else _bar(bar) for bar in bars if type(bar) is EodBar or type(bar) is dict])
+        listings[series.id] = series
+    return listings
+
+######################### screening records #########################
+
+def flatten(record:dict, prefix:str = "", row:dict = None) -> dict:
+    # nested objects become dotted column names, lists are kept as JSON text
+    row = {} if row is None else row
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flatten(value, f"{name}.", row)
+        elif isinstance(value, list):
+            row[name] = json.dumps(value)
+        else:
+            row[name] = value
+    return row
+
+
+def parse_records(content:bytes) -> list:
+    # one flat row per requested id: data.instruments / data.institutions holds an entry for each
+    data = _loads(content).get("data") or {}
+    rows = []
+    for entries in data.values():
+        if isinstance(entries, list):
+            rows += [flatten(entry) for entry in entries if isinstance(entry, dict)]
+    return rows
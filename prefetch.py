@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+import datetime
+import threading
+from findata import companies_series
+
+######################### prefetch configuration #########################
+
+PREFETCH = os.environ.get("FINDATA_PREFETCH", "1") == "1"
+WATCH_LIST = [company.strip() for company in os.environ.get("FINDATA_WATCH_LIST", "Apple,Google,Samsung,Meta,Boeing,SIX").split(",") if company.strip()]
+# ISINs of watch list companies, so the listing index is filled from reference data in bulk
+# instead of one text search per company ("Company=ISIN,..."; companies without one are searched)
+WATCH_IDS = dict(pair.split("=", 1) for pair in os.environ.get(
+    "FINDATA_WATCH_IDS", "Apple=US0378331005,Google=US02079K3059,Samsung=KR7005930003,Meta=US30303M1027,Boeing=US0970231058").split(",") if "=" in pair)
+# server local time after which the day's EoD data is final (after the US close)
+REFRESH_AT = datetime.time.fromisoformat(os.environ.get("FINDATA_REFRESH_AT", "22:30"))
+
+######################### Prefetcher #########################
+
+class Prefetcher(threading.Thread):
+    # Daemon thread that resolves the watch list and pulls its EoD data into the shared EodStore and
+    # ListingIndex once at start and then every day after REFRESH_AT, so sessions asking for those
+    # companies read everything locally. Companies with an id in ids are pre-warmed from reference data.
+    def __init__(self, api, store, index, companies:list = WATCH_LIST, from_date:str = None, refresh_at:datetime.time = REFRESH_AT,
+                 ids:dict = WATCH_IDS):
+        super().__init__(name="findata-prefetch", daemon=True)
+        self.api = api
+        self.store = store
+        self.index = index
+        self.companies = companies
+        self.ids = {company: id for company, id in ids.items() if company in companies}
+        self.from_date = from_date or (datetime.date.today() - datetime.timedelta(days=365)).isoformat()
+        self.refresh_at = refresh_at
+        self.last_refresh = None
+        self._stop_event = threading.Event()
+
+    def refresh(self) -> None:
+        start = time.perf_counter()
+        # one or two reference data requests instead of a text search per company not in the index yet
+        unknown = {company: id for company, id in self.ids.items() if len(self.index.candidates(company)) == 0}
+        if unknown:
+            logging.info(f"Pre-warmed {self.index.prewarm(self.api, unknown)}/{len(unknown)} companies from reference data")
+        results = companies_series(self.api, self.companies, self.from_date, datetime.date.today().isoformat(), self.store, self.index)
+        failed = [company for company, result in zip(self.companies, results) if isinstance(result, Exception)]
+        self.last_refresh = datetime.datetime.now()
+        logging.info(f"Prefetched {len(self.companies) - len(failed)}/{len(self.companies)} companies in {time.perf_counter() - start:.1f}s"
+                     + (f", failed: {', '.join(failed)}" if failed else ""))
+
+    def seconds_until_refresh(self) -> float:
+        now = datetime.datetime.now()
+        next_refresh = datetime.datetime.combine(now.date(), self.refresh_at)
+        if next_refresh <= now:
+            next_refresh += datetime.timedelta(days=1)
+        return (next_refresh - now).total_seconds()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as err:
+                logging.error(f"Error - prefetch: {err}")
+            self._stop_event.wait(self.seconds_until_refresh())
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def start_prefetcher(api, store, index, **kwargs) -> Prefetcher:
+    # start the process wide prefetcher, later calls return the running one
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None or not _prefetcher.is_alive():
+            _prefetcher = Prefetcher(api, store, index, **kwargs)
+            _prefetcher.start()
+        return _prefetcher
@@ -0,0 +1,176 @@
+import os
+import time
+import random
+import logging
+import threading
+import email.utils
+from concurrent.futures import Future
+
+# Request policy building blocks used by FinancialDataAPI.http_request: an adaptive token bucket,
+# jittered exponential backoff that honours Retry-After, singleflight deduplication of identical
+# in-flight requests and a circuit breaker per upstream.
+
+######################### policy configuration #########################
+
+# requests per second towards the upstream and the burst allowed on top
+RATE_LIMIT = float(os.environ.get("FINDATA_RATE_LIMIT", "20"))
+RATE_BURST = int(os.environ.get("FINDATA_RATE_BURST", "20"))
+# the rate never drops below this after repeated 429s
+MIN_RATE = 1.0
+
+MAX_RETRIES = int(os.environ.get("FINDATA_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 10.0
+# statuses worth asking again for, everything else is final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# consecutive failures that open the breaker and how long it stays open before one probe is let through
+BREAKER_FAILURES = int(os.environ.get("FINDATA_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.environ.get("FINDATA_BREAKER_RESET", "30"))
+
+######################### backoff #########################
+
+def retry_after_seconds(value):
+    # Retry-After as seconds, given either as a number of seconds or as an HTTP date; None if absent or unreadable
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def gives_up(retry_after, cap:float = BACKOFF_CAP) -> bool:
+    # the server asks to wait longer than we are willing to, retrying earlier would only be refused again
+    return retry_after is not None and retry_after > cap
+
+
+def backoff_delay(attempt:int, retry_after = None, base:float = BACKOFF_BASE, cap:float = BACKOFF_CAP) -> float:
+    # "full jitter": uniform in [0, base * 2^attempt], capped; the server's Retry-After wins when it asks for longer.
+    # A Retry-After above the cap is not waited for at all, see gives_up
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+######################### TokenBucket #########################
+
+class TokenBucket:
+    # Blocking token bucket. The rate is adaptive: halved on every 429 the upstream answers with
+    # and raised again step by step by successful requests, up to the configured rate.
+    def __init__(self, rate:float = RATE_LIMIT, burst:int = RATE_BURST, min_rate:float = MIN_RATE):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now:float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        # take one token, sleeping until there is one; returns the time waited
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def throttle(self) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            logging.info(f"Rate limited by upstream, slowing down to {self.rate:.1f} requests/s")
+
+    def relax(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+######################### SingleFlight #########################
+
+class SingleFlight:
+    # Callers asking for the same key while a call for it is in flight wait for that call's result
+    # instead of starting their own
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key:str, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result()
+
+        try:
+            result = func()
+            call.set_result(result)
+            return result
+        except BaseException as err:
+            call.set_exception(err)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+######################### CircuitBreaker #########################
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # closed:    requests go through, consecutive failures are counted
+    # open:      requests are refused until reset_timeout has passed
+    # half_open: a single probe request goes through, its outcome closes or reopens the breaker
+    def __init__(self, failures:int = BREAKER_FAILURES, reset_timeout:float = BREAKER_RESET):
+        self.max_failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logging.info("Upstream healthy again, closing the circuit breaker")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.max_failures:
+                if self.state != "open":
+                    logging.warning(f"Error - upstream failing ({self.failures} in a row), opening the circuit breaker for {self.reset_timeout}s")
+                self.state = "open"
+                self._opened = time.monotonic()
+                self._probing = False
@@ -0,0 +1,142 @@
+import os
+import time
+import logging
+import sqlite3
+import datetime
+import threading
+from cache import CACHE_DIR, DAY
+from parsing import parse_listings_by_id
+
+# how many times a failing text_search is repeated, and how many of its hits are tried for EoD data
+MAX_SEARCHES = 2
+MAX_CANDIDATES = 5
+
+UNKNOWN = "unknown"
+GOOD = "good"
+EMPTY = "empty"
+
+# An empty EoD answer says something about the window asked for, not about the listing. It is only recorded
+# for windows with at least this many weekdays, skips the listing only for windows inside the empty one,
+# and is forgotten after EMPTY_TTL.
+MIN_EMPTY_WEEKDAYS = 5
+EMPTY_TTL = 7 * DAY
+
+
+def weekdays(from_date:str, to_date:str) -> int:
+    # Monday to Friday in [from_date, to_date], inclusive ISO dates
+    first = datetime.date.fromisoformat(from_date)
+    last = datetime.date.fromisoformat(to_date)
+    days = (last - first).days + 1
+    if days <= 0:
+        return 0
+    full_weeks, rest = divmod(days, 7)
+    return 5 * full_weeks + sum(1 for i in range(rest) if (first.weekday() + i) % 7 < 5)
+
+
+def _today() -> str:
+    return datetime.date.today().isoformat()
+
+######################### ListingIndex #########################
+
+class ListingIndex:
+    # Company name -> VALOR_BC candidates with a known-good / known-empty flag each, in SQLite next to the
+    # response cache. Once a company has a good listing, resolving it is a local lookup without any request.
+    def __init__(self, cache_dir:str = CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "listings.sqlite3"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS candidates (company TEXT, position INTEGER, listing TEXT, status TEXT,
+                            updated REAL, empty_from TEXT, empty_to TEXT, PRIMARY KEY (company, listing))""")
+        # indexes written before empty answers were kept per window
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(candidates)")]
+        if "empty_from" not in columns:
+            self._db.execute("ALTER TABLE candidates ADD COLUMN empty_from TEXT")
+            self._db.execute("ALTER TABLE candidates ADD COLUMN empty_to TEXT")
+            self._db.execute("UPDATE candidates SET status = ? WHERE status = ?", (UNKNOWN, EMPTY))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _name(company:str) -> str:
+        return company.strip().lower()
+
+    def candidates(self, company:str, from_date:str = '', to_date:str = '') -> list:
+        # known-good listings first, then the others in search order. Listings known to be empty over a window
+        # holding [from_date, to_date] are left out, without dates none are.
+        to_date = to_date or _today()
+        with self._lock:
+            rows = self._db.execute("""SELECT listing, status, empty_from, empty_to, updated FROM candidates WHERE company = ?
+                                       ORDER BY status = ? DESC, position""", (self._name(company), GOOD)).fetchall()
+        expired = time.time() - EMPTY_TTL
+        return [listing for listing, status, empty_from, empty_to, updated in rows
+                if not (status == EMPTY and updated > expired and from_date and empty_from <= from_date and to_date <= empty_to)]
+
+    def add(self, company:str, listings:list) -> None:
+        # new candidates keep the order they were found in, known listings keep their status
+        with self._lock:
+            position = self._db.execute("SELECT COUNT(*) FROM candidates WHERE company = ?", (self._name(company),)).fetchone()[0]
+            self._db.executemany("INSERT OR IGNORE INTO candidates (company, position, listing, status, updated) VALUES (?, ?, ?, ?, ?)",
+                                 [(self._name(company), position + i, listing, UNKNOWN, time.time()) for i, listing in enumerate(listings)])
+
+    def mark(self, company:str, listing:str, good:bool, from_date:str = '', to_date:str = '') -> None:
+        # record whether listing had EoD data for [from_date, to_date]
+        if good:
+            with self._lock:
+                self._db.execute("""UPDATE candidates SET status = ?, updated = ?, empty_from = NULL, empty_to = NULL
+                                    WHERE company = ? AND listing = ?""", (GOOD, time.time(), self._name(company), listing))
+            return
+
+        to_date = to_date or _today()
+        if not from_date or weekdays(from_date, to_date) < MIN_EMPTY_WEEKDAYS:
+            return
+        with self._lock:
+            # a good listing can come back empty for a short window, it stays good
+            self._db.execute("""UPDATE candidates SET status = ?, updated = ?, empty_from = ?, empty_to = ?
+                                WHERE company = ? AND listing = ? AND status != ?""",
+                             (EMPTY, time.time(), from_date, to_date, self._name(company), listing, GOOD))
+
+    def resolve(self, api, company:str, from_date:str = '', to_date:str = '',
+                max_searches:int = MAX_SEARCHES, max_candidates:int = MAX_CANDIDATES) -> list:
+        # VALOR_BC candidates for company and [from_date, to_date], from the index or, when it knows none for
+        # the company yet, from at most max_searches text searches
+        known = len(self.candidates(company)) > 0
+        api.metrics.record_local("listing_index", known)
+        if not known:
+            for attempt in range(max_searches):
+                try:
+                    valors, bcs = api.text_search_listings(company)
+                    self.add(company, [f"{valor}_{bc}" for valor, bc in zip(valors, bcs)])
+                    break
+                except Exception as err:
+                    logging.warning(f"Error - text_search {company} ({attempt}): {err}")
+                    if attempt + 1 >= max_searches:
+                        # a failed search is not "no listing", the caller reports it as a failure
+                        raise
+                    api.metrics.record_retry("/v1/searchInstruments")
+        return self.candidates(company, from_date, to_date)[:max_candidates]
+
+    def prewarm(self, api, companies:dict, scheme:str = "ISIN") -> int:
+        # Fill the index for {company: instrument id in scheme} in bulk: one instrument_symbology request for all
+        # of them, then instrument_summary for those the symbology gives no listings for. Companies resolved
+        # this way never need a text search. Returns the number of companies added.
+        ids = {id: company for company, id in companies.items()}
+        added = 0
+        for end_point in ["/v1/instruments/referenceData/instrumentSymbology", "/v1/instruments/referenceData/instrumentSummary"]:
+            if len(ids) == 0:
+                break
+            try:
+                resp = api.http_request_with_scheme_id(end_point, scheme, list(ids))
+            except Exception as err:
+                logging.warning(f"Error - prewarm {end_point}: {err}")
+                continue
+            if str(resp.status_code)[0] != "2":
+                logging.warning(f"Error - prewarm {end_point}: HTTP{resp.status_code}")
+                continue
+            for id, listings in parse_listings_by_id(resp.content).items():
+                if id in ids and len(listings) > 0:
+                    self.add(ids.pop(id), listings)
+                    added += 1
+        return added
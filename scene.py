@@ -0,0 +1,267 @@
+import os
+import html
+import json
+import struct
+import hashlib
+import functools
+import numpy as np
+from static_server import ROOT, SCENE_DIR, static_url
+from assets import model_node, bundle_url, env_urls
+
+######################### scene configuration #########################
+
+# the whole world never has more bars than this, however many days and companies are asked for,
+# so the payload and the single draw call stay the same size
+MAX_BARS = 512
+MAX_BARS_PER_COMPANY = 64
+
+BAR_WIDTH = 0.3
+BAR_GAP = 0.1
+ROW_GAP = 2.0
+MAX_HEIGHT = 6.0
+MIN_HEIGHT = 0.05
+
+# scene GLBs kept on disk, the least recently used ones beyond this are removed
+MAX_SCENES = int(os.environ.get("FINVERSE_MAX_SCENES", "200"))
+
+PALETTE = [(7, 17, 204), (230, 57, 70), (42, 157, 143), (244, 162, 97), (131, 56, 236),
+           (255, 190, 11), (58, 134, 255), (251, 86, 7), (6, 214, 160), (239, 71, 111)]
+
+######################### glTF helpers #########################
+
+FLOAT = 5126
+UNSIGNED_BYTE = 5121
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+
+def pack_glb(gltf:dict, binary:bytes) -> bytes:
+    # binary glTF container: header, JSON chunk padded with spaces, BIN chunk padded with zeros
+    content = json.dumps(gltf, separators=(",", ":")).encode()
+    content += b" " * (-len(content) % 4)
+    binary += b"\0" * (-len(binary) % 4)
+    length = 12 + 8 + len(content) + (8 + len(binary) if binary else 0)
+    glb = struct.pack("<4sII", b"glTF", 2, length) + struct.pack("<I4s", len(content), b"JSON") + content
+    if binary:
+        glb += struct.pack("<I4s", len(binary), b"BIN\0") + binary
+    return glb
+
+
+class BufferBuilder:
+    # collects typed arrays into one buffer, one 4 byte aligned bufferView and accessor each
+    def __init__(self, gltf:dict):
+        self.gltf = gltf
+        self.data = bytearray()
+        gltf.setdefault("bufferViews", [])
+        gltf.setdefault("accessors", [])
+
+    def add_view(self, data:bytes, target:int = None, byte_stride:int = None) -> int:
+        self.data += b"\0" * (-len(self.data) % 4)
+        view = {"buffer": 0, "byteOffset": len(self.data), "byteLength": len(data)}
+        if byte_stride is not None:
+            view["byteStride"] = byte_stride
+        if target is not None:
+            view["target"] = target
+        self.data += data
+        self.gltf["bufferViews"].append(view)
+        return len(self.gltf["bufferViews"]) - 1
+
+    def add(self, array:np.ndarray, component_type:int, type:str, target:int = None, normalized:bool = False, bounds:bool = False,
+            byte_stride:int = None) -> int:
+        view = self.add_view(array.tobytes(), target, byte_stride)
+        accessor = {"bufferView": view, "componentType": component_type, "count": len(array), "type": type}
+        if normalized:
+            accessor["normalized"] = True
+        if bounds:
+            accessor["min"] = array.min(axis=0).tolist()
+            accessor["max"] = array.max(axis=0).tolist()
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def finish(self) -> bytes:
+        self.gltf["buffers"] = [{"byteLength": len(self.data)}]
+        return bytes(self.data)
+
+######################### bars #########################
+
+def _unit_box():
+    # 24 vertices (4 per face, so every face has its own normal) of a box spanning x, z in [-0.5, 0.5] and y in [0, 1]
+    positions = []
+    normals = []
+    for axis in range(3):
+        for sign in (-1, 1):
+            normal = [0, 0, 0]
+            normal[axis] = sign
+            u, v = [a for a in range(3) if a != axis]
+            for du, dv in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+                corner = [0.0, 0.0, 0.0]
+                corner[axis] = sign * 0.5
+                corner[u] = du * 0.5
+                corner[v] = dv * 0.5
+                positions.append(corner)
+                normals.append(normal)
+    positions = np.array(positions, dtype=np.float32)
+    positions[:, 1] += 0.5
+    normals = np.array(normals, dtype=np.float32)
+    # wind every face counter clockwise seen from outside
+    indices = []
+    for face in range(6):
+        a, b, c, d = face * 4, face * 4 + 1, face * 4 + 2, face * 4 + 3
+        n = normals[a]
+        if np.dot(np.cross(positions[b] - positions[a], positions[c] - positions[a]), n) > 0:
+            indices += [a, b, c, a, c, d]
+        else:
+            indices += [a, c, b, a, d, c]
+    return positions, normals, np.array(indices, dtype=np.uint32)
+
+BOX_POSITIONS, BOX_NORMALS, BOX_INDICES = _unit_box()
+
+
+def bucket(values:np.ndarray, bars:int) -> np.ndarray:
+    # mean of each of bars equal slices of the days, ignoring NaN (a slice without data is 0)
+    days = values.shape[1]
+    bars = max(1, min(bars, days))
+    if days == 0:
+        return np.zeros((values.shape[0], 0))
+    edges = (np.arange(bars) * days) // bars
+    sums = np.add.reduceat(np.nan_to_num(values), edges, axis=1)
+    counts = np.add.reduceat(~np.isnan(values), edges, axis=1)
+    return sums / np.maximum(counts, 1)
+
+
+def build_scene(names:list, values:np.ndarray) -> bytes:
+    # GLB with one merged, vertex coloured mesh holding a row of bars per company.
+    # values are the (companies x days) normalized series, 0..1, NaN for missing days.
+    per_company = min(MAX_BARS_PER_COMPANY, MAX_BARS // max(1, len(names)))
+    heights = np.clip(bucket(values, per_company), 0, 1) * MAX_HEIGHT + MIN_HEIGHT
+    rows, columns = heights.shape
+    count = rows * columns
+
+    # one scale and offset per bar, applied to the unit box
+    row_index = np.repeat(np.arange(rows), columns)
+    column_index = np.tile(np.arange(columns), rows)
+    scale = np.stack([np.full(count, BAR_WIDTH), heights.ravel(), np.full(count, BAR_WIDTH)], axis=1).astype(np.float32)
+    offset = np.stack([(row_index - (rows - 1) / 2) * ROW_GAP, np.zeros(count),
+                       -column_index * (BAR_WIDTH + BAR_GAP)], axis=1).astype(np.float32)
+
+    positions = (BOX_POSITIONS[None, :, :] * scale[:, None, :] + offset[:, None, :]).reshape(-1, 3)
+    normals = np.tile(BOX_NORMALS, (count, 1))
+    colors = np.array([PALETTE[row % len(PALETTE)] + (255,) for row in row_index], dtype=np.uint8).reshape(-1, 1, 4)
+    colors = np.repeat(colors, len(BOX_POSITIONS), axis=1).reshape(-1, 4)
+    indices = (BOX_INDICES[None, :] + (np.arange(count) * len(BOX_POSITIONS))[:, None]).ravel()
+    index_type = UNSIGNED_SHORT if len(positions) < 65536 else UNSIGNED_INT
+    indices = indices.astype(np.uint16 if index_type == UNSIGNED_SHORT else np.uint32)
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "FinVerse scene.py"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "name": "bars"}],
+        "materials": [{"pbrMetallicRoughness": {"baseColorFactor": [1, 1, 1, 1], "metallicFactor": 0, "roughnessFactor": 0.6}}],
+    }
+    if count == 0:
+        gltf["nodes"] = [{"name": "bars"}]
+        return pack_glb(gltf, b"")
+
+    buffer = BufferBuilder(gltf)
+    attributes = {
+        "POSITION": buffer.add(positions, FLOAT, "VEC3", ARRAY_BUFFER, bounds=True),
+        "NORMAL": buffer.add(normals, FLOAT, "VEC3", ARRAY_BUFFER),
+        "COLOR_0": buffer.add(colors, UNSIGNED_BYTE, "VEC4", ARRAY_BUFFER, normalized=True),
+    }
+    gltf["meshes"] = [{"primitives": [{"attributes": attributes, "indices": buffer.add(indices, index_type, "SCALAR", ELEMENT_ARRAY_BUFFER), "material": 0}]}]
+    return pack_glb(gltf, buffer.finish())
+
+######################### A-Frame page #########################
+
+@functools.lru_cache(maxsize=None)
+def _inline(path:str) -> str:
+    # the page is embedded inline, so its own scripts and styles travel with it
+    with open(os.path.join(ROOT, path), encoding="utf-8") as f:
+        return f.read()
+
+
+def scene_html(glb_url:str, names:list) -> str:
+    labels = "\n".join(
+        f'            <a-text value="{html.escape(name)}" align="center" width="6" color="#333" position="{(i - (len(names) - 1) / 2) * ROW_GAP} {MAX_HEIGHT + 1} -2"></a-text>'
+        for i, name in enumerate(names))
+    # company logo above each row, all picked by name from the one model bundle
+    bundle = bundle_url()
+    logos = "\n".join(
+        f'            <a-entity bundle-model="src: {html.escape(bundle)}; node: {html.escape(model_node(name))}" position="{(i - (len(names) - 1) / 2) * ROW_GAP} {MAX_HEIGHT + 2.5} -2"></a-entity>'
+        for i, name in enumerate(names) if bundle is not None and model_node(name) is not None)
+    # the cube map faces as background, a plain sky if they have not been built
+    env = env_urls()
+    background = f' cube-background="{html.escape(", ".join(env))}"' if env is not None else ""
+    sky = "" if env is not None else '\n            <a-sky color="#ECECEC"></a-sky>'
+    return f'''<!DOCTYPE html>
+<html lang="en">
+    <head>
+        <title>FinVerse</title>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1">
+        <script src="https://aframe.io/releases/1.2.0/aframe.min.js"></script>
+        <script src="https://cdn.jsdelivr.net/gh/donmccurdy/aframe-extras@v6.1.0/dist/aframe-extras.min.js"></script>
+        <script type="text/javascript">{_inline("js/webxr.js")}</script>
+        <script type="text/javascript">{_inline("js/joystick.js")}</script>
+        <script type="text/javascript">{_inline("js/bundle-model.js")}</script>
+        <style>{_inline("style.css")}</style>
+    </head>
+    <body onload="init();">
+        <a-scene renderer="antialias: false; colorManagement: false; physicallyCorrectLights: false;"{background}>
+            <a-assets>
+                <a-asset-item id="bars" src="{glb_url}"></a-asset-item>
+            </a-assets>
+
+            <a-entity gltf-model="#bars" position="0 0 -3"></a-entity>
+{labels}
+{logos}
+
+            <a-entity id="player" position="0 0 4" movement-controls="speed: 0.1;">
+                <a-entity id="camera" camera="near: 0.001" position="0 1.7 0" look-controls="pointerLockEnabled: true"></a-entity>
+                <a-entity id="leftHand" oculus-touch-controls="hand: left" vive-controls="hand: left"></a-entity>
+                <a-entity id="rightHand" laser-controls oculus-touch-controls="hand: right" vive-controls="hand: right"></a-entity>
+            </a-entity>
+
+            <a-entity light="type: ambient; color: #BBB"></a-entity>
+            <a-entity light="type: directional; color: #FFF; intensity: 0.6" position="-1 2 1"></a-entity>{sky}
+        </a-scene>
+    </body>
+</html>
+'''
+
+
+def publish_scene(names:list, values:np.ndarray, out_dir:str = SCENE_DIR) -> str:
+    # Write the GLB under a content hashed name in ./static, where Streamlit serves it, and return the page
+    # to embed with components.html. The same data always maps to the same file, so it is only written once;
+    # a reused file is touched, so prune_scenes drops the least recently used ones.
+    glb = build_scene(names, values)
+    digest = hashlib.sha1(glb + "\0".join(names).encode()).hexdigest()[:16]
+    os.makedirs(out_dir, exist_ok=True)
+    glb_path = os.path.join(out_dir, f"scene.{digest}.glb")
+    if os.path.exists(glb_path):
+        os.utime(glb_path)
+    else:
+        with open(glb_path + ".tmp", "wb") as f:
+            f.write(glb)
+        os.replace(glb_path + ".tmp", glb_path)
+        prune_scenes(out_dir)
+    return scene_html(static_url(glb_path), names)
+
+
+def prune_scenes(out_dir:str = SCENE_DIR, keep:int = MAX_SCENES) -> None:
+    # remove all but the keep most recently used scene files
+    entries = []
+    for name in os.listdir(out_dir):
+        if name.startswith("scene."):
+            try:
+                entries.append((os.path.getmtime(os.path.join(out_dir, name)), name))
+            except OSError:
+                pass
+    for _, name in sorted(entries, reverse=True)[keep:]:
+        try:
+            os.remove(os.path.join(out_dir, name))
+        except OSError:
+            pass
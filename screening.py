@@ -0,0 +1,271 @@
+import os
+import io
+import sys
+import csv
+import itertools
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import argparse
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from cache import CACHE_DIR
+from findata import FinancialDataAPI, MAX_WORKERS, MAX_BATCH_IDS, MAX_URL_LENGTH, chunk_ids
+from parsing import parse_records
+
+# Bulk ESG / regulatory screening of a portfolio: every id is asked for at every selected endpoint
+# in id chunks, concurrently and through the FinancialDataAPI cache. Each answer is flattened into
+# one row per requested id and the rows are streamed to Parquet part files, so memory is bounded by
+# the requests in flight and the part size, not by the size of the portfolio.
+#
+#   python screening.py portfolio.csv [--out screening] [--scheme ISIN] [--datasets instrument_SFDR,...]
+
+######################### screening configuration #########################
+
+# dataset name (the FinancialDataAPI method) -> endpoint
+DATASETS = {
+    "instrument_SFDR": "/v1/instruments/esg/SFDRInvestee",
+    "instrument_TAXONOMY": "/v1/instruments/esg/EUTaxonomyInvestee",
+    "instrument_EUESGMANUFACTURER": "/v1/instruments/esg/EUESGManufacturer",
+    "instrument_BASELIII_HQLA_EU": "/v1/instruments/_regulatoryData/baseliiihqlaEU",
+    "instrument_BASELIII_HQLA_CH": "/v1/instruments/_regulatoryData/baseliiihqlaCH",
+    "institution_SFDR": "/v1/institutions/esg/SFDRInvestee",
+    "institution_TAXONOMY": "/v1/institutions/esg/EUTaxonomyInvestee",
+}
+INSTRUMENT_DATASETS = [name for name in DATASETS if name.startswith("instrument_")]
+
+SCREENING_DIR = os.path.join(CACHE_DIR, "screening")
+# results of sessions nobody has touched for this long are removed
+SCREENING_TTL = 24 * 3600
+PART_ROWS = 2000
+# pyarrow is optional, without it the part files are written as JSON lines.
+# It is only imported once parts are read or written, the dashboard imports this module on every run.
+PART_FORMAT = "parquet" if importlib.util.find_spec("pyarrow") is not None else "jsonl"
+
+######################### portfolio #########################
+
+def read_portfolio(lines, scheme:str = "ISIN") -> dict:
+    # {scheme: [ids]} from a CSV with an "id" column (and optionally a "scheme" column),
+    # or from plain text with one id per line. Duplicates are dropped, the order is kept.
+    lines = iter(lines)
+    first = next(lines, "")
+    header = [column.strip().lower() for column in next(csv.reader([first]), [])]
+
+    portfolio = {}
+    if "id" in header:
+        for row in csv.DictReader(lines, fieldnames=header):
+            if row.get("id"):
+                portfolio.setdefault((row.get("scheme") or scheme).strip(), {})[row["id"].strip()] = None
+    else:
+        for line in itertools.chain([first], lines):
+            id = line.strip().split(",")[0].strip()
+            if id and not id.startswith("#"):
+                portfolio.setdefault(scheme, {})[id] = None
+    return {scheme: list(ids) for scheme, ids in portfolio.items()}
+
+######################### PartWriter #########################
+
+class PartWriter:
+    # Collects the rows of each dataset and writes them to out_dir/<dataset>/ in parts of part_rows rows,
+    # small enough to bound memory and large enough that the per file overhead of Parquet does not dominate
+    def __init__(self, out_dir:str, format:str = PART_FORMAT, part_rows:int = PART_ROWS):
+        self.out_dir = out_dir
+        self.format = format
+        self.part_rows = part_rows
+        self._buffers = {}
+        self._parts = {}
+        self._lock = threading.Lock()
+
+    def add(self, dataset:str, rows:list) -> None:
+        with self._lock:
+            buffer = self._buffers.setdefault(dataset, [])
+            buffer += rows
+            if len(buffer) < self.part_rows:
+                return
+            part = self._next_part(dataset)
+        # written outside the lock, other workers keep filling a fresh buffer meanwhile
+        self.write(dataset, part, buffer)
+
+    def close(self) -> None:
+        with self._lock:
+            remaining = [(dataset, self._next_part(dataset), rows) for dataset, rows in list(self._buffers.items()) if rows]
+        for dataset, part, rows in remaining:
+            self.write(dataset, part, rows)
+
+    def _next_part(self, dataset:str) -> int:
+        del self._buffers[dataset]
+        self._parts[dataset] = self._parts.get(dataset, -1) + 1
+        return self._parts[dataset]
+
+    def write(self, dataset:str, part:int, rows:list) -> str:
+        folder = os.path.join(self.out_dir, dataset)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"part-{part:05d}.{self.format}")
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # the columns of every row, not only those of the first one
+            columns = dict.fromkeys(column for row in rows for column in row)
+            pq.write_table(pa.table({column: [row.get(column) for row in rows] for column in columns}), path)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(row) + "\n" for row in rows)
+        return path
+
+
+def parts(out_dir:str, dataset:str) -> list:
+    folder = os.path.join(out_dir, dataset)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.startswith("part-"))
+
+
+def read_dataset(out_dir:str, dataset:str, limit:int = None) -> list:
+    # the rows of a screened dataset, at most limit of them, for previews
+    rows = []
+    for path in parts(out_dir, dataset):
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            rows += pq.read_table(path).to_pylist()
+        else:
+            with open(path, encoding="utf-8") as f:
+                rows += [json.loads(line) for line in f]
+        if limit is not None and len(rows) >= limit:
+            return rows[:limit]
+    return rows
+
+
+def combine(out_dir:str, dataset:str) -> bytes:
+    # all parts of a dataset as one file, columns missing from a part are null
+    paths = parts(out_dir, dataset)
+    if PART_FORMAT == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.concat_tables([pq.read_table(path) for path in paths], promote_options="permissive") if paths else pa.table({})
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+        return buffer.getvalue()
+    content = b""
+    for path in paths:
+        with open(path, "rb") as f:
+            content += f.read()
+    return content
+
+######################### output directories #########################
+
+def run_dir(session:str, portfolio:bytes, scheme:str, datasets:list, root:str = SCREENING_DIR) -> str:
+    # A directory per session and per input: the uploaded file, the default scheme and the datasets all change
+    # the result, and two sessions screening the same file must not write into each other's parts
+    digest = hashlib.sha1(portfolio + f"\0{scheme}\0{','.join(sorted(datasets))}".encode()).hexdigest()[:16]
+    return os.path.join(root, session, digest)
+
+
+def prune(root:str = SCREENING_DIR, max_age:float = SCREENING_TTL) -> None:
+    # remove the session directories not written to for max_age seconds
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.isdir(path) and now - os.path.getmtime(path) > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def unanswered(chunk:list, rows:list) -> int:
+    # ids of a chunk the response has no row for, or whose row says they were not found
+    found = {str(row.get("requestedId")) for row in rows if row.get("lookupStatus", "FOUND") == "FOUND"}
+    return sum(1 for id in chunk if id not in found)
+
+######################### screen #########################
+
+def screen(api:FinancialDataAPI, portfolio:dict, datasets:list = INSTRUMENT_DATASETS, out_dir:str = SCREENING_DIR,
+           max_ids:int = MAX_BATCH_IDS, max_workers:int = None, progress = None) -> dict:
+    # Fan every (dataset, scheme, id chunk) out over at most max_workers concurrent requests and stream the
+    # answered rows to part files. progress(done, total) is called after every chunk.
+    # Returns {dataset: {"rows": n, "failed": ids not answered}} plus the totals, where failed counts the ids
+    # of failed requests as well as the ids a successful response left out or did not find.
+    max_workers = max_workers or api.max_workers
+    writer = PartWriter(out_dir)
+    tasks = [(dataset, scheme, chunk) for dataset in datasets for scheme, ids in portfolio.items()
+             for chunk in chunk_ids(ids, max_ids, MAX_URL_LENGTH - len(f"{api.url}{DATASETS[dataset]}?scheme={scheme}&ids="))]
+    summary = {dataset: {"rows": 0, "failed": 0} for dataset in datasets}
+    for dataset in datasets:
+        for path in parts(out_dir, dataset):
+            os.remove(path)
+    start = time.perf_counter()
+
+    def fetch(part:int) -> tuple:
+        # request, flatten and write one chunk on the worker thread, returns the number of rows and of missing ids
+        dataset, scheme, chunk = tasks[part]
+        resp = api.http_request_with_scheme_id(DATASETS[dataset], scheme, chunk)
+        if str(resp.status_code)[0] != "2":
+            raise Exception(f"HTTP{resp.status_code}")
+        rows = parse_records(resp.content)
+        writer.add(dataset, rows)
+        return len(rows), unanswered(chunk, rows)
+
+    # only a window of tasks is submitted at a time, so at most that many chunks are held in memory
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        next_task = 0
+        done = 0
+        while next_task < len(tasks) or pending:
+            while next_task < len(tasks) and len(pending) < 2 * max_workers:
+                pending[executor.submit(fetch, next_task)] = next_task
+                next_task += 1
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                part = pending.pop(future)
+                dataset, scheme, chunk = tasks[part]
+                try:
+                    rows, missing = future.result()
+                    summary[dataset]["rows"] += rows
+                    summary[dataset]["failed"] += missing
+                except Exception as err:
+                    logging.warning(f"Error - {dataset} {scheme} chunk {part} ({len(chunk)} ids): {err}")
+                    summary[dataset]["failed"] += len(chunk)
+                done += 1
+                if progress is not None:
+                    progress(done, len(tasks))
+
+    writer.close()
+    summary["requests"] = len(tasks)
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen a portfolio against the SIX ESG and regulatory endpoints")
+    parser.add_argument("portfolio", help="CSV with an id (and optional scheme) column, or one id per line")
+    parser.add_argument("--out", default=SCREENING_DIR, help="directory for the part files")
+    parser.add_argument("--scheme", default="ISIN", help="id scheme of ids without one")
+    parser.add_argument("--datasets", default=",".join(INSTRUMENT_DATASETS), help=f"comma separated, from {', '.join(DATASETS)}")
+    parser.add_argument("--chunk", type=int, default=MAX_BATCH_IDS, help="ids per request")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent requests")
+    args = parser.parse_args()
+
+    datasets = args.datasets.split(",")
+    unknown = [dataset for dataset in datasets if dataset not in DATASETS]
+    if unknown:
+        parser.error(f"unknown datasets: {', '.join(unknown)}")
+
+    with open(args.portfolio, encoding="utf-8") as f:
+        portfolio = read_portfolio(f, args.scheme)
+
+    api = FinancialDataAPI(max_workers=args.workers or MAX_WORKERS)
+    summary = screen(api, portfolio, datasets, args.out, args.chunk, args.workers,
+                     progress=lambda done, total: print(f"\r{done}/{total} requests", end="", file=sys.stderr))
+    print(file=sys.stderr)
+    print(json.dumps(summary, indent=2))
+    api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import logging
+import argparse
+import datetime
+import threading
+import urllib.parse
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the SIX financial data API: answers the endpoints FinancialDataAPI uses with
+# deterministic, realistically shaped payloads (the same id always gets the same data, overlapping date
+# ranges agree), configurable latency and injected 429/503 faults. It counts the calls it serves,
+# so benchmarks can report upstream traffic. Point the app at it without client certificates:
+#
+#   python simulator.py --port 8765
+#   FINDATA_URL=http://127.0.0.1:8765 FINDATA_CERT_DIR= streamlit run app.py
+
+######################### simulator configuration #########################
+
+SIMULATOR_HOST = os.environ.get("SIMULATOR_HOST", "127.0.0.1")
+SIMULATOR_PORT = int(os.environ.get("SIMULATOR_PORT", "8765"))
+
+BCS = ["4", "67", "1", "149", "380"]
+CURRENCIES = ["CHF", "USD", "EUR"]
+MARKETS = ["XSWX", "XNAS", "XNYS", "XETR"]
+
+
+class Simulator:
+    # latency:         seconds every request takes at least
+    # latency_per_id:  extra seconds per requested id, so batched requests are slower than single ones
+    # jitter:          mean of the exponentially distributed extra latency, gives a long tail
+    # error_rate:      fraction of requests answered with 503
+    # throttle_rate:   fraction of requests answered with 429 and a Retry-After header
+    # search_hits:     hits per text search
+    # empty_rate:      fraction of search hits without any EoD data, to exercise the candidate fallback
+    # esg_indicators:  indicators per ESG / regulatory record, drives the payload size of those endpoints
+    def __init__(self, latency:float = 0.05, latency_per_id:float = 0.001, jitter:float = 0.01, error_rate:float = 0.0,
+                 throttle_rate:float = 0.0, search_hits:int = 5, empty_rate:float = 0.2, esg_indicators:int = 20, seed:int = 0):
+        self.latency = latency
+        self.latency_per_id = latency_per_id
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.search_hits = search_hits
+        self.empty_rate = empty_rate
+        self.esg_indicators = esg_indicators
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.ids = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.statuses = defaultdict(int)
+
+    def reset(self) -> None:
+        with self._lock:
+            for counter in (self.calls, self.ids, self.bytes, self.statuses):
+                counter.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": dict(self.calls), "ids": dict(self.ids), "bytes": dict(self.bytes),
+                    "statuses": {str(status): n for status, n in self.statuses.items()},
+                    "total_calls": sum(self.calls.values())}
+
+    ######################### request handling #########################
+
+    def handle(self, path:str) -> tuple:
+        # (status, headers, body) for a request path, after sleeping for its simulated latency
+        url = urllib.parse.urlparse(path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        end_point = url.path
+        ids = [id for id in query.get("ids", "").split(",") if id]
+
+        with self._lock:
+            draw = self._random.random()
+            delay = self.latency + self.latency_per_id * len(ids) + (self._random.expovariate(1 / self.jitter) if self.jitter > 0 else 0)
+        time.sleep(delay)
+
+        if draw < self.error_rate:
+            status, headers, body = 503, {}, b'{"errors": [{"code": "SERVICE_UNAVAILABLE"}]}'
+        elif draw < self.error_rate + self.throttle_rate:
+            status, headers, body = 429, {"Retry-After": "1"}, b'{"errors": [{"code": "TOO_MANY_REQUESTS"}]}'
+        else:
+            data = self.respond(end_point, query, ids)
+            if data is None:
+                status, headers, body = 404, {}, b'{"errors": [{"code": "NOT_FOUND"}]}'
+            else:
+                status, headers, body = 200, {}, json.dumps({"data": data}).encode()
+
+        with self._lock:
+            self.calls[end_point] += 1
+            self.ids[end_point] += len(ids)
+            self.bytes[end_point] += len(body)
+            self.statuses[status] += 1
+        return status, headers, body
+
+    def respond(self, end_point:str, query:dict, ids:list):
+        if end_point.endswith("/searchInstruments"):
+            return {"searchInstruments": self.search(query.get("query", ""))}
+        if end_point.endswith("/marketData/eodTimeseries"):
+            return {"listings": [self.eod(id, query.get("from", ""), query.get("to", "")) for id in ids]}
+
+        kind = end_point.split("/")[2] if end_point.count("/") >= 2 else ""
+        if kind not in ("instruments", "institutions", "markets"):
+            return None
+        if "/referenceData/" in end_point:
+            return {kind: [self.reference(kind, id, query.get("scheme", "")) for id in ids]}
+        if "/esg/" in end_point or "/_regulatoryData/" in end_point:
+            return {kind: [self.esg(end_point, id, query.get("scheme", "")) for id in ids]}
+        return None
+
+    ######################### payloads #########################
+
+    @staticmethod
+    def _number(*parts) -> int:
+        # stable pseudo random number for the given parts, the same across processes and runs
+        return int(hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:12], 16)
+
+    def _valor(self, query:str, hit:int) -> str:
+        return str(1000000 + self._number("valor", query.strip().lower()) % 90000000 + hit)
+
+    def search(self, query:str) -> list:
+        hits = []
+        for hit in range(self.search_hits):
+            valor = self._valor(query, hit)
+            hits.append({"hit": {
+                "valor": valor, "bc": BCS[hit % len(BCS)], "isin": f"CH{int(valor):010d}",
+                "name": f"{query} {['Ltd', 'AG', 'Inc', 'SA', 'Corp'][hit % 5]}", "instrumentType": "EQUITY",
+                "marketCode": MARKETS[hit % len(MARKETS)], "currency": CURRENCIES[hit % len(CURRENCIES)]}})
+        return hits
+
+    def eod(self, listing:str, from_date:str, to_date:str) -> dict:
+        entry = {"requestedId": listing, "requestedScheme": "VALOR_BC", "lookupStatus": "FOUND", "marketData": {"eodTimeseries": []}}
+        if self._number("empty", listing) % 1000 < 1000 * self.empty_rate:
+            return entry
+
+        today = datetime.date.today()
+        start = datetime.date.fromisoformat(from_date) if from_date else today - datetime.timedelta(days=365)
+        end = min(datetime.date.fromisoformat(to_date) if to_date else today, today)
+        base = 20 + self._number("price", listing) % 500
+        phase = self._number("phase", listing) % 628 / 100
+
+        bars = entry["marketData"]["eodTimeseries"]
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                # a slow wave plus a per day wiggle, both fixed by listing and date
+                n = day.toordinal()
+                wiggle = (self._number(listing, n) % 1000) / 1000
+                close = base * (1 + 0.25 * math.sin(n / 40 + phase) + 0.02 * (wiggle - 0.5))
+                spread = close * (0.005 + 0.03 * wiggle)
+                bars.append({"sessionDate": day.isoformat(), "open": round(close - spread / 3, 4),
+                             "high": round(close + spread / 2, 4), "low": round(close - spread / 2, 4), "close": round(close, 4),
+                             "volume": 1000 + self._number("volume", listing, n) % 500000, "currency": CURRENCIES[base % 3]})
+            day += datetime.timedelta(days=1)
+        return entry
+
+    def reference(self, kind:str, id:str, scheme:str) -> dict:
+        valor = self._valor(id, 0)
+        entry = {"requestedId": id, "requestedScheme": scheme, "lookupStatus": "FOUND"}
+        if kind == "instruments":
+            entry["referenceData"] = {"instrumentSymbology": {"valor": valor, "isin": f"CH{int(valor):010d}"},
+                                      "listings": [{"valor": valor, "bc": BCS[i], "marketCode": MARKETS[i % len(MARKETS)]} for i in range(2)],
+                                      "instrumentSummary": {"shortName": f"Instrument {id}", "instrumentType": "EQUITY",
+                                                            "currency": CURRENCIES[int(valor) % 3]}}
+        else:
+            entry["referenceData"] = {"name": f"{kind[:-1].title()} {id}", "lei": f"{self._number('lei', id):020X}"[:20],
+                                      "country": ["CH", "US", "DE"][int(valor) % 3]}
+        return entry
+
+    def esg(self, end_point:str, id:str, scheme:str) -> dict:
+        indicators = {}
+        for i in range(self.esg_indicators):
+            value = self._number(end_point, id, i) % 100000 / 100
+            indicators[f"indicator{i:02d}"] = {"value": value, "unit": ["t", "%", "MWh"][i % 3], "coverage": value % 1}
+        return {"requestedId": id, "requestedScheme": scheme, "lookupStatus": "FOUND",
+                "esg": {"reportingDate": "2022-12-31", "dataSource": "SIX", "indicators": indicators}}
+
+######################### SimulatorHandler #########################
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        simulator = self.server.simulator
+        if self.path.split("?")[0] == "/_simulator/stats":
+            status, headers, body = 200, {}, json.dumps(simulator.stats()).encode()
+        else:
+            # the API is mounted below any prefix, e.g. /api/findata/v1/...
+            path = self.path[self.path.find("/v1/"):] if "/v1/" in self.path else self.path
+            status, headers, body = simulator.handle(path)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"simulator: {format % args}")
+
+
+def start_simulator(host:str = SIMULATOR_HOST, port:int = SIMULATOR_PORT, simulator:Simulator = None) -> ThreadingHTTPServer:
+    # serve the simulator on a daemon thread, port 0 picks a free port (see server.server_port)
+    server = ThreadingHTTPServer((host, port), SimulatorHandler)
+    server.daemon_threads = True
+    server.simulator = simulator if simulator is not None else Simulator()
+    threading.Thread(target=server.serve_forever, name="six-simulator", daemon=True).start()
+    return server
+
+
+def main():
+    defaults = Simulator()
+    parser = argparse.ArgumentParser(description="Local simulator of the SIX financial data API")
+    parser.add_argument("--host", default=SIMULATOR_HOST)
+    parser.add_argument("--port", type=int, default=SIMULATOR_PORT)
+    for name in ["latency", "latency_per_id", "jitter", "error_rate", "throttle_rate", "empty_rate"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=getattr(defaults, name))
+    for name in ["search_hits", "esg_indicators"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=getattr(defaults, name))
+    args = vars(parser.parse_args())
+
+    host, port = args.pop("host"), args.pop("port")
+    server = start_simulator(host, port, Simulator(**args))
+    print(f"SIX API simulator on http://{host}:{server.server_port}, stats at /_simulator/stats")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import logging
+import threading
+import ipaddress
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from metrics import METRICS
+
+######################### static files configuration #########################
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Streamlit serves ./static itself at app/static/ (server.enableStaticServing in .streamlit/config.toml),
+# with range requests for media, over the app's own origin and scheme; relative, so it also works below
+# a base URL path
+STREAMLIT_STATIC = os.path.join(ROOT, "static")
+STREAMLIT_STATIC_URL = "app/static"
+
+SCENE_DIR = os.path.join(ROOT, "static", "scenes")
+
+# /metrics is opt in: only served when FINDATA_METRICS_PORT is set, one port per Streamlit process.
+# Local only by default, it is not meant for the public.
+METRICS_HOST = os.environ.get("FINDATA_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ["FINDATA_METRICS_PORT"]) if os.environ.get("FINDATA_METRICS_PORT") else None
+
+
+def static_url(path:str) -> str:
+    # URL the browser loads a file in ./static from, percent encoded: file names may contain spaces
+    path = os.path.abspath(path)
+    if not path.startswith(STREAMLIT_STATIC + os.sep):
+        raise ValueError(f"{path} is not below {STREAMLIT_STATIC}, Streamlit does not serve it")
+    return f"{STREAMLIT_STATIC_URL}/{urllib.parse.quote(os.path.relpath(path, STREAMLIT_STATIC).replace(os.sep, '/'))}"
+
+######################### MetricsHandler #########################
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Prometheus scrape endpoint for the FinancialDataAPI metrics of this process, answered to local
+        # clients only even when the server is bound to a public address
+        if self.path.split("?")[0] != "/metrics" or not ipaddress.ip_address(self.client_address[0]).is_loopback:
+            self.send_error(404)
+            return
+        content = METRICS.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logging.debug(f"metrics: {format % args}")
+
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(host:str = METRICS_HOST, port:int = METRICS_PORT) -> ThreadingHTTPServer:
+    # serve /metrics on a daemon thread, once per process; raises OSError when the port is taken
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logging.info(f"Serving /metrics on {host}:{port}")
+        return _server
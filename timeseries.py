@@ -0,0 +1,106 @@
+import warnings
+import numpy as np
+
+######################### SeriesFrame #########################
+
+FIELDS = ["open", "high", "low", "close", "volume"]
+
+
+class SeriesFrame:
+    # Open/high/low/close/volume of several listings as (listings x days) float arrays on a shared date index.
+    # Days a listing has no bar for are NaN.
+    def __init__(self, names:list, dates:np.ndarray, **columns):
+        self.names = list(names)
+        self.dates = dates
+        for name in FIELDS:
+            setattr(self, name, columns.get(name, np.full((len(self.names), len(dates)), np.nan)))
+
+    @classmethod
+    def from_series(cls, names:list, series:list):
+        # align parsing.ListingSeries records on the union of their session dates
+        dates = np.array(sorted({bar.date for s in series for bar in s.bars if bar.date}), dtype="datetime64[D]")
+        columns = {name: np.full((len(names), len(dates)), np.nan) for name in FIELDS}
+        for row, s in enumerate(series):
+            bars = [bar for bar in s.bars if bar.date]
+            if len(bars) == 0:
+                continue
+            index = np.searchsorted(dates, np.array([bar.date for bar in bars], dtype="datetime64[D]"))
+            for name in FIELDS:
+                columns[name][row, index] = np.array([getattr(bar, name) for bar in bars], dtype=float)
+        return cls(names, dates, **columns)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def row(self, name:str) -> int:
+        return self.names.index(name)
+
+    ######################### derived metrics #########################
+
+    def spread(self) -> np.ndarray:
+        return self.high - self.low
+
+    def normalized_spread(self) -> np.ndarray:
+        # high - low divided by the largest spread of the same listing
+        return scale_max(self.spread())
+
+    def returns(self) -> np.ndarray:
+        # close to close returns against the previous day the same listing traded,
+        # so days only other listings have do not break the series. NaN where there is no close.
+        days = np.arange(self.close.shape[1])
+        last = np.maximum.accumulate(np.where(np.isnan(self.close), -1, days), axis=1)
+        previous = np.full(last.shape, -1)
+        previous[:, 1:] = last[:, :-1]
+        previous_close = np.take_along_axis(self.close, np.maximum(previous, 0), axis=1)
+        previous_close[previous < 0] = np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = self.close / previous_close - 1
+        returns[~np.isfinite(returns)] = np.nan
+        return returns
+
+    def rolling_volatility(self, window:int = 20) -> np.ndarray:
+        # standard deviation of the returns over the last window days, NaN until the window is full
+        returns = self.returns()
+        volatility = np.full(returns.shape, np.nan)
+        if returns.shape[1] < window:
+            return volatility
+        windows = np.lib.stride_tricks.sliding_window_view(returns, window, axis=1)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            volatility[:, window - 1:] = np.nanstd(windows, axis=2)
+        return volatility
+
+######################### scaling #########################
+# all scalers work per row and ignore NaN, rows that are empty, flat or all NaN become 0
+
+def _finite_reduce(func, values:np.ndarray, fill:float) -> np.ndarray:
+    finite = np.where(np.isfinite(values), values, fill)
+    return func(finite, axis=-1, keepdims=True) if values.shape[-1] else np.full(values.shape[:-1] + (1,), fill)
+
+
+def scale_max(values:np.ndarray) -> np.ndarray:
+    peak = _finite_reduce(np.max, values, -np.inf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = np.where(np.isfinite(peak) & (peak != 0), values / peak, 0.0)
+    return np.where(np.isnan(values), np.nan, scaled)
+
+
+def scale_minmax(values:np.ndarray) -> np.ndarray:
+    low = _finite_reduce(np.min, values, np.inf)
+    high = _finite_reduce(np.max, values, -np.inf)
+    span = high - low
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = np.where(np.isfinite(span) & (span != 0), (values - low) / span, 0.0)
+    return np.where(np.isnan(values), np.nan, scaled)
+
+
+def scale_zscore(values:np.ndarray) -> np.ndarray:
+    if values.shape[-1] == 0:
+        return values.copy()
+    # nanmean/nanstd warn about all NaN rows, those are handled below
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(values, axis=-1, keepdims=True)
+        std = np.nanstd(values, axis=-1, keepdims=True)
+        scaled = np.where(np.isfinite(std) & (std != 0), (values - mean) / std, 0.0)
+    return np.where(np.isnan(values), np.nan, scaled)